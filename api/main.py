@@ -1,18 +1,36 @@
-import os, uuid, json, subprocess, sys
+import os, uuid, json, time, asyncio
 from pathlib import Path
-from fastapi import FastAPI, HTTPException ,BackgroundTasks
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse
 from pydantic import BaseModel
-from typing import Optional
-from api.tasks.sandbox_job import start_sandbox_job
+from typing import List, Optional
+from api.tasks.run_index import get_index
+from api.tasks.job_queue import JobQueue, QueueFull, STATES, QUEUE_WORKERS, spawn_workers, stop_workers
+from api.tasks.progress import FINAL_EVENTS, get_bus, read_from
+from runner.run_agent_in_sandbox import read_events
+from runner import storage
 
 APP_VERSION = "0.1.0"
 DATA_DIR = os.getenv("DATA_DIR", "/data")
 REPORTS_DIR = os.path.join(DATA_DIR, "reports")
 Path(REPORTS_DIR).mkdir(parents=True, exist_ok=True)
 
-app = FastAPI(title="Neuralife Agent Evaluator API", version=APP_VERSION)
+queue = JobQueue()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Long-running work happens in separate worker processes fed by the durable queue
+    workers = spawn_workers(QUEUE_WORKERS) if QUEUE_WORKERS > 0 else []
+    index = get_index()
+    if index.counts() == {"reports": 0, "traces": 0}:
+        # First start with an empty index: pick up files written before it existed
+        print(f"Indexing existing reports and traces: {index.rebuild(DATA_DIR)}")
+    yield
+    stop_workers(workers)
+
+app = FastAPI(title="Neuralife Agent Evaluator API", version=APP_VERSION, lifespan=lifespan)
 
 # Serve static UI at /ui
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -34,13 +52,34 @@ class StartEvalRequest(BaseModel):
     timeout: int = 30
     memory: str = "256m"
     cpus: str = "0.5"
+    # Sent on the agent's stdin
+    prompt: Optional[str] = None
 
 class RunEvalRequest(BaseModel):
     raw_results_path: str
+    # Reuse unchanged (test, rubric) cells from the run's existing report
+    incremental: bool = False
+
+class RunMatrixRequest(BaseModel):
+    archives: List[str]
+    # Suite paths or glob patterns, e.g. tests/examples/*.yaml
+    suites: List[str]
+    cmd: str = "python agent_main.py"
+    concurrency: int = 4
+    baseline: int = 0
 
 class RunSuiteRequest(BaseModel):
     suite: str
     archive_path: str
+    concurrency: int = 1
+    raw_format: Optional[str] = None
+    # >1 runs each test repeatedly (graded, with early stopping) and returns a report
+    trials: int = 1
+    ci_width: Optional[float] = None
+    # Serve every test from long-lived agent processes; None uses NLE_PERSISTENT_AGENT
+    persistent: Optional[bool] = None
+    # Grade each test as soon as it finishes (pipelined) and return the report too
+    grade: bool = False
 
 @app.get("/")
 def root():
@@ -54,65 +93,73 @@ def health():
 def welcome():
     return {"message": "Neuralife Agent Evaluator running", "version": APP_VERSION}
 
-def run_pipeline_task(raw_path: str):
-    """Background task to run the evaluation pipeline script."""
+def _enqueue(kind: str, payload: dict, job_id: str = None):
     try:
-        # Assuming evaluation_pipeline.py is in /app/evaluation/
-        cmd = ["python", "evaluation/evaluation_pipeline.py", "--data", raw_path]
-        print(f"Starting pipeline: {' '.join(cmd)}")
-        
-        # Fix: Add current directory to PYTHONPATH so 'graders' module is found
-        env = os.environ.copy()
-        env["PYTHONPATH"] = os.getcwd()
-        
-        subprocess.run(cmd, check=True, env=env)
-        print(f"Pipeline finished for {raw_path}")
-    except subprocess.CalledProcessError as e:
-        print(f"Pipeline failed: {e}")
-    except Exception as e:
-        print(f"Error running pipeline: {e}")
+        job_id = queue.enqueue(kind, payload, job_id=job_id)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"status": "queued", "job_id": job_id, "status_url": f"/jobs/{job_id}"}
 
 @app.post("/run-evaluation")
-def run_evaluation(req: RunEvalRequest, background_tasks: BackgroundTasks):
-    """Triggers the Day 3 evaluation pipeline."""
+def run_evaluation(req: RunEvalRequest):
+    """Queues the Day 3 evaluation pipeline; poll /jobs/{job_id} for the report paths."""
     if not os.path.exists(req.raw_results_path):
         raise HTTPException(status_code=404, detail="Raw results file not found")
-    
-    # Run in background so UI doesn't hang
-    background_tasks.add_task(run_pipeline_task, req.raw_results_path)
-    
-    return {"status": "started", "message": "Evaluation pipeline started in background"}
+    return _enqueue("pipeline", {"raw_results_path": req.raw_results_path, "incremental": req.incremental})
 
 @app.post("/run-suite")
 def run_suite_endpoint(req: RunSuiteRequest):
     """
-    Executes a full test suite using cli.py.
+    Queues a full test suite run; the job result holds raw_results_path
+    (plus report_json/report_html with grade=true or trials > 1).
     """
     if not os.path.exists(req.suite):
         raise HTTPException(status_code=400, detail=f"Suite file not found: {req.suite}")
     if not os.path.exists(req.archive_path):
         raise HTTPException(status_code=400, detail=f"Archive file not found: {req.archive_path}")
+    return _enqueue("suite", {"suite": req.suite, "archive_path": req.archive_path, "concurrency": req.concurrency,
+                             "raw_format": req.raw_format, "trials": req.trials, "ci_width": req.ci_width,
+                             "persistent": req.persistent, "grade": req.grade})
 
-    # Construct the CLI command
-    cmd = [sys.executable, "cli.py", "run-suite", "--suite", req.suite, "--archive", req.archive_path]
-    
-    try:
-        # Run the CLI command
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True, cwd=os.getcwd())
-        
-        # Parse stdout to find the generated raw_results path
-        output_path = None
-        for line in result.stdout.splitlines():
-            if "Saved raw results to:" in line:
-                output_path = line.split("Saved raw results to:")[1].strip()
-                
-        return {
-            "status": "success", 
-            "output": result.stdout,
-            "raw_results_path": output_path
-        }
-    except subprocess.CalledProcessError as e:
-        return {"status": "error", "error": e.stderr, "stdout": e.stdout}
+@app.post("/run-matrix")
+def run_matrix_endpoint(req: RunMatrixRequest):
+    """
+    Queues N archives x M suites on one shared concurrency budget, then grades
+    every cell and compares each archive with the baseline one.
+    """
+    missing = [a for a in req.archives if not os.path.exists(a)]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Archive file not found: {', '.join(missing)}")
+    if not 0 <= req.baseline < len(req.archives):
+        raise HTTPException(status_code=400, detail="baseline must index into archives")
+    return _enqueue("matrix", req.model_dump())
+
+@app.get("/comparison/{matrix_id}")
+def get_comparison(matrix_id: str):
+    path = storage.resolve(os.path.join(REPORTS_DIR, f"{matrix_id}_comparison.json"))
+    if path is None:
+        raise HTTPException(status_code=404, detail="Comparison not found")
+    return storage.load_json(path)
+
+@app.get("/jobs")
+def list_jobs(status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50, offset: int = 0):
+    if status and status not in STATES:
+        raise HTTPException(status_code=400, detail=f"status must be one of {', '.join(STATES)}")
+    return {"counts": queue.counts(), "jobs": queue.list(status, kind, max(1, min(limit, 500)), max(0, offset))}
+
+@app.get("/jobs/{job_id}")
+def get_job(job_id: str):
+    """Job state (queued/running/succeeded/failed/cancelled) plus its result or error."""
+    job = queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="job not found")
+    return job
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    if not queue.cancel(job_id):
+        raise HTTPException(status_code=409, detail="only queued jobs can be cancelled")
+    return {"status": "cancelled", "job_id": job_id}
 
 @app.post("/run-welcome")
 def run_welcome():
@@ -126,31 +173,155 @@ def run_welcome():
 def start_eval(req: StartEvalRequest):
     if not Path(req.archive_path).exists():
         raise HTTPException(status_code=400, detail="archive_path not found on server")
-    result = start_sandbox_job(req.archive_path, req.cmd, req.timeout, req.memory, req.cpus)
-    return {"status": "completed", **result}
+    # The sandbox job reuses the queue id, so /trace/{job_id} and its events follow the same id
+    return _enqueue("sandbox", req.model_dump())
 
 @app.get("/trace-list")
 def trace_list():
-    files = sorted([f for f in os.listdir(DATA_DIR) if f.endswith("_trace.json")])
-    return {"traces": files}
+    return {"traces": [f"{job_id}_trace.json" for job_id in get_index().names("traces")]}
+
+@app.get("/traces")
+def list_traces(archive: Optional[str] = None, exit_code: Optional[int] = None, since: Optional[float] = None, until: Optional[float] = None,
+                sort: str = "created_at", order: str = "desc", limit: int = 50, offset: int = 0):
+    """Paginated trace summaries from the index (no trace file is opened)."""
+    try:
+        return get_index().list_traces(archive, exit_code, since, until, sort, order, max(1, min(limit, 500)), max(0, offset))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _events_path(job_id: str):
+    return os.path.join(DATA_DIR, f"{job_id}_events.jsonl")
+
+def _events_page(job_id: str, cursor: int, offset: Optional[int], limit: int, type: Optional[str]):
+    path = _events_path(job_id)
+    if not os.path.exists(path):
+        return None
+    types = set(type.split(",")) if type else None
+    return read_events(path, cursor=cursor, limit=max(1, min(limit, 5000)), offset=offset, types=types)
 
 @app.get("/trace/{job_id}")
-def get_trace(job_id: str):
-    trace_path = os.path.join(DATA_DIR, f"{job_id}_trace.json")
-    if not os.path.exists(trace_path):
+def get_trace(job_id: str, offset: Optional[int] = None, limit: Optional[int] = None, cursor: Optional[int] = None, type: Optional[str] = None):
+    """
+    Returns the trace summary. With offset/limit/cursor/type, also returns one
+    page of the job's event log under "events" plus "next_cursor".
+    """
+    # Compact storage writes <job_id>_trace.json.zst / .gz; resolve() finds either form
+    trace_path = storage.resolve(os.path.join(DATA_DIR, f"{job_id}_trace.json"))
+    paged = any(v is not None for v in (offset, limit, cursor, type))
+    if trace_path is None:
+        # A running job has no summary yet, but its event log can already be read
+        if paged and os.path.exists(_events_path(job_id)):
+            return {"job_id": job_id, "status": "running", **_events_page(job_id, cursor or 0, offset, limit or 500, type)}
         raise HTTPException(status_code=404, detail="trace not found")
-    with open(trace_path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    trace = storage.load_json(trace_path)
+    if paged:
+        trace.update(_events_page(job_id, cursor or 0, offset, limit or 500, type) or {"events": [], "next_cursor": 0, "eof": True})
+    return trace
+
+@app.get("/trace/{job_id}/events")
+def get_trace_events(job_id: str, cursor: int = 0, offset: Optional[int] = None, limit: int = 500, type: Optional[str] = None):
+    """Pages through a job's JSONL event log; pass next_cursor back to tail it incrementally."""
+    page = _events_page(job_id, cursor, offset, limit, type)
+    if page is None:
+        raise HTTPException(status_code=404, detail="events not found")
+    return page
+
+PROGRESS_POLL_SECONDS = float(os.getenv("NLE_PROGRESS_POLL_SECONDS", "0.25"))
+PROGRESS_KEEPALIVE_SECONDS = 15.0
+
+def _progress_done(channel: str, seen_types: set):
+    """True once the channel has published its final event, or its queue job settled without one."""
+    if seen_types & set(FINAL_EVENTS):
+        return True
+    job = queue.get(channel)
+    if job is None:
+        # A CLI run (channel = run id) has no queue job; it ends with its run or grading
+        return bool(seen_types & {"run_end", "grading_end"})
+    return job["status"] not in ("queued", "running")
+
+@app.get("/progress/{channel}")
+def get_progress(channel: str, cursor: int = 0, limit: int = 500):
+    """Pages through a job's (or run's) progress events; pass next_cursor back to continue."""
+    path = get_bus().path(channel)
+    if not os.path.exists(path):
+        if queue.get(channel) is None:
+            raise HTTPException(status_code=404, detail="progress not found")
+        return {"events": [], "next_cursor": cursor, "eof": True}
+    page = read_from(path, cursor, max(1, min(limit, 5000)))
+    return {"events": [e for _, e in page], "next_cursor": page[-1][0] if page else cursor, "eof": len(page) < limit}
+
+@app.get("/progress/{channel}/stream")
+async def stream_progress(channel: str, request: Request, cursor: int = 0):
+    """
+    Server-Sent Events stream of a queued job's progress (channel = job id,
+    or a run id for CLI runs): job_start, run_start, test_queued,
+    test_running, test_finished, grading_start, test_graded (with the test
+    score and the partial aggregate), run_end / grading_end, job_end. Each
+    event's SSE id is a byte cursor, so a reconnecting EventSource resumes
+    via Last-Event-ID. The stream closes after the job settles.
+    """
+    path = get_bus().path(channel)
+    if not os.path.exists(path) and queue.get(channel) is None:
+        raise HTTPException(status_code=404, detail="progress not found")
+    last_id = request.headers.get("last-event-id")
+    if last_id and last_id.isdigit():
+        cursor = int(last_id)
+
+    async def events():
+        pos, seen, last_sent = cursor, set(), time.monotonic()
+        yield "retry: 2000\n\n"
+        while not await request.is_disconnected():
+            page = read_from(path, pos) if os.path.exists(path) else []
+            for pos, event in page:
+                seen.add(event.get("type"))
+                yield f"id: {pos}\nevent: {event.get('type', 'message')}\ndata: {json.dumps(event)}\n\n"
+            if page:
+                last_sent = time.monotonic()
+                continue
+            if _progress_done(channel, seen):
+                if not seen & set(FINAL_EVENTS):
+                    job = queue.get(channel)
+                    # Cancelled / lost jobs never publish job_end themselves
+                    end = {"ts": time.time(), "channel": channel, "type": "job_end", "status": job["status"] if job else None}
+                    yield f"event: job_end\ndata: {json.dumps(end)}\n\n"
+                return
+            if time.monotonic() - last_sent >= PROGRESS_KEEPALIVE_SECONDS:
+                last_sent = time.monotonic()
+                yield ": keepalive\n\n"
+            await asyncio.sleep(PROGRESS_POLL_SECONDS)
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
 
 # --- NEW DAY 3 ENDPOINTS ---
 
 @app.get("/report-list")
 def report_list():
     """Lists all generated evaluation reports."""
-    if not os.path.exists(REPORTS_DIR):
-        return {"reports": []}
-    files = sorted([f for f in os.listdir(REPORTS_DIR) if f.endswith("_report.json")])
-    return {"reports": files}
+    return {"reports": [f"{run_id}_report.json" for run_id in get_index().names("reports")]}
+
+@app.get("/reports")
+def list_reports(suite: Optional[str] = None, archive: Optional[str] = None, min_score: Optional[float] = None, max_score: Optional[float] = None,
+                 since: Optional[float] = None, until: Optional[float] = None, sort: str = "generated_at", order: str = "desc",
+                 limit: int = 50, offset: int = 0):
+    """
+    Paginated report summaries (run_id, suite, archive, total_score,
+    rubric_avg, timestamps) straight from the index. since/until are epoch seconds.
+    """
+    try:
+        return get_index().list_reports(suite, archive, min_score, max_score, since, until, sort, order,
+                                        max(1, min(limit, 500)), max(0, offset))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/reports/aggregate")
+def aggregate_reports(bucket: str = "day", suite: Optional[str] = None, archive: Optional[str] = None,
+                      since: Optional[float] = None, until: Optional[float] = None):
+    """Score trend: runs and mean total/rubric scores per hour, day, week or month."""
+    try:
+        return {"bucket": bucket, "series": get_index().aggregate(bucket, suite, archive, since, until)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/report/{run_id}")
 def get_report(run_id: str):
@@ -160,12 +331,10 @@ def get_report(run_id: str):
     else:
         filename = run_id
         
-    path = os.path.join(REPORTS_DIR, filename)
-    if not os.path.exists(path):
+    path = storage.resolve(os.path.join(REPORTS_DIR, filename))
+    if path is None:
         raise HTTPException(status_code=404, detail="Report not found")
-    
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+    return storage.load_json(path)
 
 @app.get("/report-html/{run_id}")
 def get_report_html(run_id: str):
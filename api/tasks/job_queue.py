@@ -0,0 +1,271 @@
+import os
+import sys
+import json
+import time
+import uuid
+import signal
+import socket
+import sqlite3
+import argparse
+import threading
+import subprocess
+from pathlib import Path
+
+QUEUE_DB = os.getenv("NLE_QUEUE_DB", os.path.join(os.getenv("DATA_DIR", "/data"), "jobs.sqlite3"))
+# Worker processes the API starts itself (0 = run `python -m api.tasks.job_queue worker` separately)
+QUEUE_WORKERS = int(os.getenv("NLE_QUEUE_WORKERS", "1"))
+# Jobs each worker process runs at once
+QUEUE_CONCURRENCY = int(os.getenv("NLE_QUEUE_CONCURRENCY", "2"))
+# Enqueue is refused once this many jobs are waiting
+QUEUE_MAX_DEPTH = int(os.getenv("NLE_QUEUE_MAX_DEPTH", "100"))
+QUEUE_MAX_ATTEMPTS = int(os.getenv("NLE_QUEUE_MAX_ATTEMPTS", "3"))
+HEARTBEAT_SECONDS = 10.0
+# A running job whose worker stopped heartbeating this long ago is requeued
+STALE_SECONDS = float(os.getenv("NLE_QUEUE_STALE_SECONDS", "60"))
+POLL_SECONDS = 0.5
+
+STATES = ("queued", "running", "succeeded", "failed", "cancelled")
+
+class QueueFull(Exception):
+    pass
+
+class JobQueue:
+    """
+    Durable FIFO of jobs in a SQLite file (WAL mode), shared by the API and
+    any number of worker processes. Claims are atomic (BEGIN IMMEDIATE) and
+    jobs left running by a dead worker are requeued once their heartbeat goes stale.
+    """
+
+    def __init__(self, db_path: str = QUEUE_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, kind TEXT NOT NULL, payload TEXT NOT NULL,"
+            " status TEXT NOT NULL, result TEXT, error TEXT, attempts INTEGER NOT NULL DEFAULT 0,"
+            " worker TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL, heartbeat REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs(status, created_at)")
+
+    def _tx(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                out = fn(self._conn)
+                self._conn.execute("COMMIT")
+                return out
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, kind: str, payload: dict, job_id: str = None, max_depth: int = QUEUE_MAX_DEPTH) -> str:
+        """Adds a job and returns its id; raises QueueFull when max_depth jobs are already waiting."""
+        job_id = job_id or str(uuid.uuid4())
+
+        def insert(c):
+            depth = c.execute("SELECT COUNT(*) FROM jobs WHERE status = 'queued'").fetchone()[0]
+            if max_depth and depth >= max_depth:
+                raise QueueFull(f"queue is full ({depth} jobs waiting)")
+            c.execute("INSERT INTO jobs (id, kind, payload, status, created_at) VALUES (?, ?, ?, 'queued', ?)",
+                      (job_id, kind, json.dumps(payload), time.time()))
+        self._tx(insert)
+        return job_id
+
+    def _requeue_stale(self, c, now):
+        c.execute("UPDATE jobs SET status = 'failed', finished_at = ?, error = 'worker lost (max attempts reached)'"
+                  " WHERE status = 'running' AND heartbeat < ? AND attempts >= ?", (now, now - STALE_SECONDS, QUEUE_MAX_ATTEMPTS))
+        c.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE status = 'running' AND heartbeat < ?",
+                  (now - STALE_SECONDS,))
+
+    def claim(self, worker: str):
+        """Moves the oldest queued job to running for `worker`; returns it, or None if the queue is empty."""
+        def take(c):
+            now = time.time()
+            self._requeue_stale(c, now)
+            row = c.execute("SELECT id, kind, payload FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1").fetchone()
+            if not row:
+                return None
+            c.execute("UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat = ?, attempts = attempts + 1"
+                      " WHERE id = ?", (worker, now, now, row[0]))
+            return {"id": row[0], "kind": row[1], "payload": json.loads(row[2])}
+        return self._tx(take)
+
+    def heartbeat(self, worker: str):
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET heartbeat = ? WHERE worker = ? AND status = 'running'", (time.time(), worker))
+
+    def finish(self, job_id: str, result: dict = None, error: str = None):
+        status = "failed" if error else "succeeded"
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ? AND status = 'running'",
+                               (status, json.dumps(result) if result is not None else None, error, time.time(), job_id))
+
+    def release(self, worker: str):
+        """Puts a stopping worker's running jobs back in the queue."""
+        with self._lock:
+            self._conn.execute("UPDATE jobs SET status = 'queued', worker = NULL WHERE worker = ? AND status = 'running'", (worker,))
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancels a job that has not started yet."""
+        with self._lock:
+            return self._conn.execute("UPDATE jobs SET status = 'cancelled', finished_at = ? WHERE id = ? AND status = 'queued'",
+                                      (time.time(), job_id)).rowcount == 1
+
+    def _row(self, row):
+        job = dict(zip(("id", "kind", "payload", "status", "result", "error", "attempts", "worker",
+                        "created_at", "started_at", "finished_at", "heartbeat"), row))
+        job["payload"] = json.loads(job["payload"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if not row:
+                return None
+            job = self._row(row)
+            if job["status"] == "queued":
+                job["queue_position"] = self._conn.execute(
+                    "SELECT COUNT(*) FROM jobs WHERE status = 'queued' AND created_at < ?", (job["created_at"],)).fetchone()[0]
+        return job
+
+    def list(self, status: str = None, kind: str = None, limit: int = 50, offset: int = 0):
+        where, args = [], []
+        if status:
+            where.append("status = ?")
+            args.append(status)
+        if kind:
+            where.append("kind = ?")
+            args.append(kind)
+        sql = "SELECT * FROM jobs" + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY created_at DESC LIMIT ? OFFSET ?"
+        with self._lock:
+            return [self._row(r) for r in self._conn.execute(sql, [*args, limit, offset]).fetchall()]
+
+    def counts(self):
+        with self._lock:
+            rows = dict(self._conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+        return {s: rows.get(s, 0) for s in STATES}
+
+# --- job handlers (run inside worker processes) ---
+
+def _run_sandbox(job_id: str, p: dict):
+    from api.tasks.sandbox_job import start_sandbox_job
+    # The queue id doubles as the sandbox job id, so /trace/{id} works while it runs
+    return start_sandbox_job(p["archive_path"], p.get("cmd", "python agent_main.py"), p.get("timeout", 30),
+                             p.get("memory", "256m"), p.get("cpus", "0.5"), job_id=job_id, prompt=p.get("prompt"))
+
+def _run_suite(job_id: str, p: dict):
+    from executor.test_executor import run_suite_from_file
+    if p.get("trials", 1) > 1:
+        from evaluation.trials import run_trials
+        kwargs = {"ci_width": p["ci_width"]} if p.get("ci_width") is not None else {}
+        out_json, out_html = run_trials(p["suite"], p["archive_path"], p.get("cmd", "python agent_main.py"), max_trials=p["trials"],
+                                        concurrency=p.get("concurrency", 1), **kwargs)
+        return {"report_json": str(out_json), "report_html": str(out_html)}
+    if p.get("grade"):
+        from evaluation.pipelined import run_pipelined
+        out_json, out_html, raw = run_pipelined(p["suite"], p["archive_path"], p.get("cmd", "python agent_main.py"),
+                                                concurrency=p.get("concurrency", 1), persistent=p.get("persistent"), progress=job_id)
+        return {"raw_results_path": str(raw), "report_json": str(out_json), "report_html": str(out_html)}
+    out = run_suite_from_file(p["suite"], p["archive_path"], p.get("cmd", "python agent_main.py"), concurrency=p.get("concurrency", 1),
+                              raw_format=p.get("raw_format"), persistent=p.get("persistent"), progress=job_id)
+    return {"raw_results_path": str(out)}
+
+def _run_pipeline(job_id: str, p: dict):
+    from evaluation.evaluation_pipeline import build_evaluation_report
+    out_json, out_html = build_evaluation_report(Path(p["raw_results_path"]), incremental=p.get("incremental", False), progress=job_id)
+    return {"report_json": str(out_json), "report_html": str(out_html)}
+
+def _run_matrix(job_id: str, p: dict):
+    from executor.matrix_runner import run_matrix
+    from evaluation.compare import build_comparison_report
+    manifest = run_matrix(p["archives"], p["suites"], p.get("cmd", "python agent_main.py"), concurrency=p.get("concurrency", 4))
+    out_json, out_html = build_comparison_report(manifest, baseline=p.get("baseline", 0))
+    return {"manifest_path": str(manifest), "comparison_json": str(out_json), "comparison_html": str(out_html)}
+
+HANDLERS = {
+    "sandbox": _run_sandbox,
+    "suite": _run_suite,
+    "pipeline": _run_pipeline,
+    "matrix": _run_matrix,
+}
+
+def execute(queue: JobQueue, job: dict):
+    from api.tasks.progress import publish
+    # The job id is the progress channel, so /progress/{job_id}/stream follows it from here
+    publish(job["id"], "job_start", kind=job["kind"], attempt=job.get("attempts"))
+    try:
+        result = HANDLERS[job["kind"]](job["id"], job["payload"])
+    except Exception as e:
+        print(f"Job {job['id']} ({job['kind']}) failed: {e}")
+        # job_end goes out first so a stream never sees the job settled without it
+        publish(job["id"], "job_end", status="failed", error=f"{type(e).__name__}: {e}")
+        queue.finish(job["id"], error=f"{type(e).__name__}: {e}")
+    else:
+        publish(job["id"], "job_end", status="succeeded", result=result)
+        queue.finish(job["id"], result=result)
+
+def run_worker(db_path: str = QUEUE_DB, concurrency: int = QUEUE_CONCURRENCY, stop: threading.Event = None):
+    """Claims and runs jobs on `concurrency` threads until `stop` is set (or SIGTERM/SIGINT)."""
+    queue = JobQueue(db_path)
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    stop = stop or threading.Event()
+    if threading.current_thread() is threading.main_thread():
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda *_: stop.set())
+
+    def loop():
+        while not stop.is_set():
+            job = queue.claim(worker)
+            if job is None:
+                stop.wait(POLL_SECONDS)
+                continue
+            execute(queue, job)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(max(1, concurrency))]
+    for t in threads:
+        t.start()
+    print(f"Queue worker {worker} started ({len(threads)} slots, db={db_path})")
+    while not stop.wait(HEARTBEAT_SECONDS):
+        queue.heartbeat(worker)
+    # Jobs still running are abandoned with the process; hand them to another worker
+    queue.release(worker)
+    print(f"Queue worker {worker} stopped")
+
+def spawn_workers(count: int = QUEUE_WORKERS, concurrency: int = QUEUE_CONCURRENCY, db_path: str = QUEUE_DB):
+    """Starts `count` worker processes next to the API; returns their Popen handles."""
+    env = os.environ.copy()
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (os.getcwd(), env.get("PYTHONPATH")) if p)
+    cmd = [sys.executable, "-m", "api.tasks.job_queue", "worker", "--concurrency", str(concurrency), "--db", str(db_path)]
+    return [subprocess.Popen(cmd, env=env, stdin=subprocess.DEVNULL) for _ in range(count)]
+
+def stop_workers(procs, timeout: float = 10.0):
+    for proc in procs:
+        proc.terminate()
+    for proc in procs:
+        try:
+            proc.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+def main():
+    p = argparse.ArgumentParser(description="Evaluation job queue")
+    sub = p.add_subparsers(dest="action", required=True)
+    w = sub.add_parser("worker", help="run jobs from the queue")
+    w.add_argument("--concurrency", type=int, default=QUEUE_CONCURRENCY)
+    w.add_argument("--db", default=QUEUE_DB)
+    s = sub.add_parser("status", help="print job counts by state")
+    s.add_argument("--db", default=QUEUE_DB)
+    args = p.parse_args()
+
+    if args.action == "worker":
+        run_worker(args.db, args.concurrency)
+    elif args.action == "status":
+        print(json.dumps(JobQueue(args.db).counts()))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import json
+import time
+import threading
+
+PROGRESS = os.getenv("NLE_PROGRESS", "1") == "1"
+PROGRESS_DIR = os.getenv("NLE_PROGRESS_DIR", os.path.join(os.getenv("NLE_DATA_DIR", os.getenv("DATA_DIR", "/data")), "progress"))
+# A channel is finished once one of these is published on it
+FINAL_EVENTS = ("job_end",)
+# Channel files untouched this long are deleted (checked at startup and whenever a
+# channel finishes); long enough for clients to catch up or reconnect. 0 keeps them forever
+PROGRESS_RETENTION = float(os.getenv("NLE_PROGRESS_RETENTION_SECONDS", "86400"))
+
+class ProgressBus:
+    """
+    In-process publish/subscribe for run progress (test queued / running /
+    finished / graded, partial scores). Every event is also appended to
+    <PROGRESS_DIR>/<channel>.jsonl, which is how the API process sees
+    events published by queue worker processes and how a reconnecting
+    client resumes from where it left off.
+    """
+
+    def __init__(self, directory: str = PROGRESS_DIR, retention: float = PROGRESS_RETENTION):
+        self.directory = directory
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._subscribers = []  # (channel or None for all, callback)
+        os.makedirs(directory, exist_ok=True)
+        self.prune()
+
+    def path(self, channel: str) -> str:
+        return os.path.join(self.directory, f"{channel}.jsonl")
+
+    def subscribe(self, callback, channel: str = None):
+        """Calls callback(event) for every event (on `channel` only, if given); returns an unsubscribe function."""
+        entry = (channel, callback)
+        with self._lock:
+            self._subscribers.append(entry)
+        def unsubscribe():
+            with self._lock:
+                if entry in self._subscribers:
+                    self._subscribers.remove(entry)
+        return unsubscribe
+
+    def publish(self, channel: str, type: str, **data):
+        event = {"ts": time.time(), "channel": channel, "type": type, **data}
+        line = json.dumps(event) + "\n"
+        with self._lock:
+            # One write per event keeps lines whole for concurrent tailers
+            with open(self.path(channel), "a", encoding="utf-8") as f:
+                f.write(line)
+            subscribers = [cb for ch, cb in self._subscribers if ch is None or ch == channel]
+        if type in FINAL_EVENTS:
+            self.prune()
+        for cb in subscribers:
+            try:
+                cb(event)
+            except Exception as e:
+                print(f"WARNING: progress subscriber failed: {e}")
+        return event
+
+    def prune(self) -> int:
+        """Deletes channel files not written to for `retention` seconds; returns how many."""
+        if self.retention <= 0:
+            return 0
+        cutoff = time.time() - self.retention
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.endswith(".jsonl") and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass  # removed by another process meanwhile
+        return removed
+
+def read_from(path: str, cursor: int = 0, limit: int = 500):
+    """[(cursor after the event, event)] for complete lines from byte `cursor` on; a partial last line is left for later."""
+    out = []
+    with open(path, "rb") as f:
+        f.seek(cursor)
+        while len(out) < limit:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            cursor += len(line)
+            out.append((cursor, json.loads(line)))
+    return out
+
+_bus = None
+_bus_lock = threading.Lock()
+
+def get_bus() -> ProgressBus:
+    """Process-wide bus instance."""
+    global _bus
+    with _bus_lock:
+        if _bus is None:
+            _bus = ProgressBus()
+        return _bus
+
+def publish(channel: str, type: str, **data):
+    # Progress is best effort: a failure here must never fail the run itself
+    if not PROGRESS or not channel:
+        return
+    try:
+        get_bus().publish(channel, type, **data)
+    except Exception as e:
+        print(f"WARNING: could not publish progress for {channel}: {e}")
@@ -0,0 +1,184 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from pathlib import Path
+
+INDEX_DB = os.getenv("NLE_INDEX_DB", os.path.join(os.getenv("NLE_DATA_DIR", os.getenv("DATA_DIR", "/data")), "index.sqlite3"))
+RUBRICS = ("correctness", "reasoning", "tool_usage", "safety", "robustness")
+REPORT_SORTS = ("generated_at", "total_score", "run_id", "suite", "test_count")
+TRACE_SORTS = ("created_at", "job_id", "wall_seconds", "exit_code")
+# strftime patterns for /reports/aggregate buckets
+BUCKETS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d", "week": "%Y-W%W", "month": "%Y-%m"}
+
+class RunIndex:
+    """
+    SQLite summary of every report and trace (one row each), written when the
+    file is written, so listings and trends never open the JSON files.
+    """
+
+    def __init__(self, db_path: str = INDEX_DB):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS reports ("
+            " run_id TEXT PRIMARY KEY, suite TEXT, archive TEXT, total_score REAL,"
+            f" {', '.join(f'{r} REAL' for r in RUBRICS)},"
+            " test_count INTEGER, grading_mode TEXT, path TEXT NOT NULL,"
+            " generated_at REAL NOT NULL, indexed_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS traces ("
+            " job_id TEXT PRIMARY KEY, archive TEXT, exit_code INTEGER, wall_seconds REAL,"
+            " peak_rss_bytes INTEGER, container TEXT, path TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        for sql in ("CREATE INDEX IF NOT EXISTS reports_time ON reports(generated_at)",
+                    "CREATE INDEX IF NOT EXISTS reports_suite ON reports(suite, generated_at)",
+                    "CREATE INDEX IF NOT EXISTS reports_archive ON reports(archive, generated_at)",
+                    "CREATE INDEX IF NOT EXISTS traces_time ON traces(created_at)"):
+            self._conn.execute(sql)
+
+    def add_report(self, report: dict, path: str):
+        rubric_avg = report.get("rubric_avg") or {}
+        tests = report.get("tests")
+        row = (report["run_id"], report.get("suite"), report.get("agent_archive"), report.get("total_score"),
+               *(rubric_avg.get(r) for r in RUBRICS),
+               report.get("test_count", len(tests) if isinstance(tests, list) else None), report.get("grading_mode"),
+               str(path), report.get("generated_at") or _mtime(path), time.time())
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO reports VALUES ({','.join('?' * len(row))})", row)
+
+    def add_trace(self, trace: dict, path: str):
+        res = trace.get("resources") or {}
+        row = (trace["job_id"], trace.get("archive_path"), trace.get("exit_code"), res.get("wall_seconds"),
+               res.get("peak_rss_bytes"), trace.get("container"), str(path), trace.get("created_at") or _mtime(path))
+        with self._lock:
+            self._conn.execute(f"INSERT OR REPLACE INTO traces VALUES ({','.join('?' * len(row))})", row)
+
+    def _where(self, filters):
+        where, args = [], []
+        for sql, value in filters:
+            if value is not None:
+                where.append(sql)
+                args.append(value)
+        return (" WHERE " + " AND ".join(where) if where else ""), args
+
+    def _page(self, table, sort, sorts, order, limit, offset, filters):
+        if sort not in sorts:
+            raise ValueError(f"sort must be one of {', '.join(sorts)}")
+        where, args = self._where(filters)
+        direction = "ASC" if order == "asc" else "DESC"
+        with self._lock:
+            total = self._conn.execute(f"SELECT COUNT(*) FROM {table}{where}", args).fetchone()[0]
+            cur = self._conn.execute(f"SELECT * FROM {table}{where} ORDER BY {sort} {direction} LIMIT ? OFFSET ?", [*args, limit, offset])
+            cols = [d[0] for d in cur.description]
+            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
+        return {"total": total, "limit": limit, "offset": offset, "items": rows}
+
+    def list_reports(self, suite=None, archive=None, min_score=None, max_score=None, since=None, until=None,
+                     sort="generated_at", order="desc", limit=50, offset=0):
+        page = self._page("reports", sort, REPORT_SORTS, order, limit, offset, [
+            ("suite = ?", suite), ("archive = ?", archive), ("total_score >= ?", min_score),
+            ("total_score <= ?", max_score), ("generated_at >= ?", since), ("generated_at < ?", until)])
+        for row in page["items"]:
+            row["rubric_avg"] = {r: row.pop(r) for r in RUBRICS}
+        return page
+
+    def list_traces(self, archive=None, exit_code=None, since=None, until=None, sort="created_at", order="desc", limit=50, offset=0):
+        return self._page("traces", sort, TRACE_SORTS, order, limit, offset, [
+            ("archive = ?", archive), ("exit_code = ?", exit_code), ("created_at >= ?", since), ("created_at < ?", until)])
+
+    def names(self, table: str):
+        """Every run_id / job_id, sorted, for the legacy flat list endpoints."""
+        key = "run_id" if table == "reports" else "job_id"
+        with self._lock:
+            return [r[0] for r in self._conn.execute(f"SELECT {key} FROM {table} ORDER BY {key}")]
+
+    def aggregate(self, bucket="day", suite=None, archive=None, since=None, until=None):
+        """Runs, mean/min/max total_score and mean rubric scores per time bucket, oldest first."""
+        if bucket not in BUCKETS:
+            raise ValueError(f"bucket must be one of {', '.join(BUCKETS)}")
+        where, args = self._where([("suite = ?", suite), ("archive = ?", archive),
+                                   ("generated_at >= ?", since), ("generated_at < ?", until)])
+        sql = (f"SELECT strftime('{BUCKETS[bucket]}', generated_at, 'unixepoch') AS b, COUNT(*),"
+               f" AVG(total_score), MIN(total_score), MAX(total_score), {', '.join(f'AVG({r})' for r in RUBRICS)}"
+               f" FROM reports{where} GROUP BY b ORDER BY b")
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        return [{"bucket": b, "runs": n, "avg_total_score": _round(avg), "min_total_score": lo, "max_total_score": hi,
+                 "rubric_avg": {r: _round(v) for r, v in zip(RUBRICS, rest)}} for b, n, avg, lo, hi, *rest in rows]
+
+    def counts(self):
+        with self._lock:
+            return {t: self._conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("reports", "traces")}
+
+    def rebuild(self, data_dir: str):
+        """Indexes every *_report.json / *_trace.json (compressed or not) already on disk (one-off backfill)."""
+        from runner import storage
+        added = {"reports": 0, "traces": 0, "skipped": 0}
+        for kind, pattern in (("reports", "reports/*_report.json*"), ("traces", "*_trace.json*")):
+            for path in Path(data_dir).glob(pattern):
+                if path.name.endswith(".tmp"):
+                    continue
+                try:
+                    doc = storage.load_json(path)
+                    if kind == "reports":
+                        self.add_report(doc, path)
+                    else:
+                        self.add_trace(doc, path)
+                    added[kind] += 1
+                except (OSError, ValueError, KeyError):
+                    added["skipped"] += 1
+        return added
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return time.time()
+
+def _round(v):
+    return round(v, 2) if v is not None else None
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_index() -> RunIndex:
+    """Process-wide index instance."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = RunIndex()
+        return _index
+
+def record_report(report: dict, path):
+    # Indexing is best effort: a failure here must never fail the evaluation itself
+    try:
+        get_index().add_report(report, path)
+    except Exception as e:
+        print(f"WARNING: could not index report {report.get('run_id')}: {e}")
+
+def record_trace(trace: dict, path):
+    try:
+        get_index().add_trace(trace, path)
+    except Exception as e:
+        print(f"WARNING: could not index trace {trace.get('job_id')}: {e}")
+
+def main():
+    p = argparse.ArgumentParser(description="Report / trace index maintenance")
+    sub = p.add_subparsers(dest="action", required=True)
+    r = sub.add_parser("rebuild", help="index every report and trace already in the data dir")
+    r.add_argument("--data-dir", default=os.getenv("NLE_DATA_DIR", os.getenv("DATA_DIR", "/data")))
+    r.add_argument("--db", default=INDEX_DB)
+    args = p.parse_args()
+    if args.action == "rebuild":
+        print(json.dumps(RunIndex(args.db).rebuild(args.data_dir)))
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
-import os, subprocess, json
-from pathlib import Path
+import os
+import asyncio
+from runner.run_agent_in_sandbox import run_job, add_trace_hook
+from api.tasks.run_index import record_trace
 
-RUNNER_PY = Path("/app/runner/run_agent_in_sandbox.py")
+# Record every trace in the API's listing index (api/tasks/run_index.py)
+TRACE_INDEX = os.getenv("NLE_TRACE_INDEX", "1") == "1"
+if TRACE_INDEX:
+    add_trace_hook(record_trace)
 
-def start_sandbox_job(archive_path: str, cmd: str = "python agent_main.py", timeout: int = 30, memory: str = "256m", cpus: str = "0.5"):
-    if not RUNNER_PY.exists():
-        raise FileNotFoundError(f"Runner not found at {RUNNER_PY}")
-    proc = subprocess.run(
-        ["python", str(RUNNER_PY), "--archive", archive_path, "--cmd", cmd, "--timeout", str(timeout), "--memory", memory, "--cpus", str(cpus)],
-        capture_output=True, text=True
-    )
-    try:
-        return json.loads(proc.stdout.strip())
-    except Exception:
-        return {"stdout": proc.stdout, "stderr": proc.stderr, "returncode": proc.returncode}
+def start_sandbox_job(archive_path: str, cmd: str = "python agent_main.py", timeout: int = 30, memory: str = "256m", cpus: str = "0.5", job_id: str = None,
+                      prompt: str = None):
+    job_id, trace_path = run_job(archive_path, cmd, timeout, memory, str(cpus), job_id=job_id, prompt=prompt)
+    return {"job_id": job_id, "trace_path": trace_path}
+
+async def start_sandbox_job_async(archive_path: str, cmd: str = "python agent_main.py", timeout: int = 30, memory: str = "256m", cpus: str = "0.5", job_id: str = None,
+                                  prompt: str = None):
+    return await asyncio.to_thread(start_sandbox_job, archive_path, cmd, timeout, memory, cpus, job_id, prompt)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the docker CLI so the evaluator can be benchmarked on hosts
+without Docker (point NLE_DOCKER_BIN at this file). Containers are plain
+host processes: `run` and `exec` run the sandbox command with /agent mapped
+to the `-v` host path, `run -d` only records the container, and every
+other subcommand succeeds with no output (so resource sampling reports
+nothing rather than host-wide numbers).
+
+    NLE_FAKE_DOCKER_STATE        where `run -d` containers are recorded
+    NLE_FAKE_DOCKER_START_DELAY  seconds added to each `run` (container start cost)
+"""
+import json, os, sys, time
+
+STATE_DIR = os.environ.get("NLE_FAKE_DOCKER_STATE", "/tmp/nle_fake_docker")
+START_DELAY = float(os.environ.get("NLE_FAKE_DOCKER_START_DELAY", "0"))
+FLAGS = ("-d", "-i", "-t", "--rm")
+
+def _parse_run(args):
+    """(flags, options, command) of `docker run`; options keep repeated keys like -e."""
+    flags, opts, i = set(), [], 0
+    while i < len(args) and args[i].startswith("-"):
+        if args[i] in FLAGS:
+            flags.add(args[i])
+            i += 1
+        else:
+            opts.append((args[i], args[i + 1]))
+            i += 2
+    # args[i] is the image
+    return flags, opts, args[i + 1:]
+
+def _state(name: str) -> str:
+    return os.path.join(STATE_DIR, f"{name}.json")
+
+def _exec(mount: str, env: dict, command):
+    if command[:1] == ["bash"] and len(command) == 3:
+        # A container's login shell is cheap; the host's profile scripts are not
+        command = ["bash", "-c", command[2].replace("/agent", mount)]
+    os.chdir(mount)
+    os.execvpe(command[0], command, {**os.environ, **env})
+
+def main():
+    args = sys.argv[1:]
+    action = args[0] if args else ""
+    if action == "version":
+        print("fake-docker (bench)")
+    elif action == "run":
+        flags, opts, command = _parse_run(args[1:])
+        opt = dict(opts)
+        mount = opt.get("-v", "").split(":")[0]
+        env = dict(v.split("=", 1) for k, v in opts if k == "-e")
+        if START_DELAY:
+            time.sleep(START_DELAY)
+        if "-d" in flags:
+            os.makedirs(STATE_DIR, exist_ok=True)
+            with open(_state(opt["--name"]), "w", encoding="utf-8") as f:
+                json.dump({"mount": mount, "env": env}, f)
+            print(opt["--name"])
+            return
+        _exec(mount, env, command)
+    elif action == "exec":
+        rest = [a for a in args[1:] if a not in FLAGS]
+        name, command = rest[0], rest[1:]
+        try:
+            with open(_state(name), "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except OSError:
+            print(f"Error: No such container: {name}", file=sys.stderr)
+            sys.exit(1)
+        # Only agent commands run; pool housekeeping (kill -9 -1, rm -rf /tmp/*)
+        # would hit the host itself
+        if len(command) == 3 and command[2].startswith("cd /agent"):
+            _exec(state["mount"], state["env"], command)
+    elif action == "rm":
+        for name in args[1:]:
+            if not name.startswith("-") and os.path.exists(_state(name)):
+                os.remove(_state(name))
+
+if __name__ == "__main__":
+    main()
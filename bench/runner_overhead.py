@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Per-job overhead of the sandbox runner: the old subprocess hop
+(`python runner/run_agent_in_sandbox.py` + JSON on stdout) versus the
+in-process `run_job` API. Overhead is wall time minus the agent's own
+`duration_seconds` from the trace.
+
+    python bench/runner_overhead.py --jobs 20
+"""
+import argparse, json, os, shutil, statistics, subprocess, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+RUNNER_PY = ROOT / "runner" / "run_agent_in_sandbox.py"
+AGENT_DIR = ROOT / "sample_agents" / "home_automation"
+
+def _summary(samples):
+    samples = sorted(samples)
+    return {
+        "mean_ms": round(statistics.mean(samples) * 1000, 2),
+        "p50_ms": round(samples[len(samples) // 2] * 1000, 2),
+        "max_ms": round(samples[-1] * 1000, 2),
+    }
+
+def _overhead(wall, trace_path):
+    with open(trace_path, "r", encoding="utf-8") as f:
+        return max(0.0, wall - (json.load(f).get("duration_seconds") or 0))
+
+def bench_subprocess(archive, cmd, jobs):
+    walls, overheads = [], []
+    for _ in range(jobs):
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, str(RUNNER_PY), "--archive", archive, "--cmd", cmd],
+            capture_output=True, text=True, env=os.environ.copy()
+        )
+        wall = time.perf_counter() - t0
+        out = json.loads(proc.stdout.strip())
+        walls.append(wall)
+        overheads.append(_overhead(wall, out["trace_path"]))
+    return {"wall": _summary(walls), "overhead": _summary(overheads)}
+
+def bench_in_process(archive, cmd, jobs):
+    sys.path.insert(0, str(ROOT))
+    from runner.run_agent_in_sandbox import run_job
+    walls, overheads = [], []
+    for _ in range(jobs):
+        t0 = time.perf_counter()
+        _, trace_path = run_job(archive, cmd)
+        wall = time.perf_counter() - t0
+        walls.append(wall)
+        overheads.append(_overhead(wall, trace_path))
+    return {"wall": _summary(walls), "overhead": _summary(overheads)}
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--jobs", type=int, default=20)
+    p.add_argument("--cmd", default="python agent_main.py")
+    args = p.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="nle_bench_")
+    try:
+        # Runner reads NLE_DATA_DIR at import time, in both modes
+        os.environ["NLE_DATA_DIR"] = os.path.join(tmp, "data")
+        archive = shutil.make_archive(os.path.join(tmp, "agent"), "gztar", root_dir=str(AGENT_DIR))
+        result = {
+            "jobs": args.jobs,
+            "cmd": args.cmd,
+            "subprocess": bench_subprocess(archive, args.cmd, args.jobs),
+            "in_process": bench_in_process(archive, args.cmd, args.jobs),
+        }
+        result["overhead_saved_ms"] = round(
+            result["subprocess"]["overhead"]["mean_ms"] - result["in_process"]["overhead"]["mean_ms"], 2
+        )
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Bytes on disk and read latency of a synthetic N-test run (traces, raw
+results, report) in each storage mode: the default pretty JSON with traces
+embedded in raw results, and compact mode (minified + gzip / zstd, raw
+results referencing traces by path + sha256).
+
+    python bench/storage_footprint.py --tests 1000
+"""
+import argparse, json, os, random, shutil, statistics, sys, tempfile, time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+from runner import storage
+
+WORDS = ("the agent checks the living room lights then sets the thermostat to 21 degrees because the schedule "
+         "says evening mode step one turn off the heater step two confirm with the user finally report status").split()
+RUBRICS = ("correctness", "reasoning", "tool_usage", "safety", "robustness")
+
+def _trace(rng, job_id, archive):
+    stdout = "\n".join(" ".join(rng.choices(WORDS, k=14)) for _ in range(rng.randint(20, 40)))
+    calls = [{"name": rng.choice(["lights.set", "thermostat.set", "weather.get"]), "args": {"room": "living", "value": rng.randint(0, 30)},
+              "result": {"ok": True}} for _ in range(rng.randint(0, 3))]
+    return {
+        "job_id": job_id, "archive_path": archive, "command": "python agent_main.py",
+        "duration_seconds": round(rng.uniform(0.5, 3), 3), "exit_code": 0,
+        "stdout_snippet": stdout, "stderr_snippet": "", "tool_calls": calls,
+        "stdout_bytes": len(stdout), "stderr_bytes": 0, "stdout_truncated": False, "stderr_truncated": False,
+        "stdout_log": None, "stderr_log": None,
+        "resources": {"wall_seconds": round(rng.uniform(0.5, 3), 3), "cpu_seconds": round(rng.uniform(0.1, 1), 3),
+                      "peak_rss_bytes": rng.randint(30, 90) << 20, "samples": 8, "source": "proc+wait4"},
+        "workdir": f"/data/work/{job_id}", "files": ["agent_main.py", "tools.py", "requirements.txt"],
+        "docker_cmd": None, "container": "local", "host_mount_base": None,
+        "events_path": f"/data/{job_id}_events.jsonl", "created_at": time.time(),
+    }
+
+def _size(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+def _ms(samples):
+    return {"mean_ms": round(statistics.mean(samples) * 1000, 3), "p50_ms": round(sorted(samples)[len(samples) // 2] * 1000, 3)}
+
+def bench_mode(base, mode, compression, tests):
+    storage.STORAGE_MODE, storage.COMPRESSION = mode, compression
+    data = Path(base) / f"{mode}_{compression}"
+    (data / "reports").mkdir(parents=True)
+    rng = random.Random(0)
+    archive = "/data/agents/home_automation_agent.tar.gz"
+
+    t0 = time.perf_counter()
+    trace_paths, raw_tests = [], []
+    for i in range(tests):
+        job_id = f"job{i:05d}"
+        trace = _trace(rng, job_id, archive)
+        path = storage.dump_json(trace, str(data / f"{job_id}_trace.json"))
+        trace_paths.append(path)
+        raw_tests.append(storage.ref_trace({"test_id": f"t{i}", "prompt": "Turn on the lights", "job_id": job_id,
+                                            "trace_path": path, "trace": trace, "duration": trace["duration_seconds"]}))
+    raw_path = storage.dump_json({"run_id": "bench", "suite": "synthetic", "tests": raw_tests}, str(data / "reports" / "bench_raw_results.json"))
+    report = {"run_id": "bench", "total_score": 71.2, "rubric_avg": {r: 7.1 for r in RUBRICS},
+              "tests": [{"test_id": t["test_id"], "job_id": t["job_id"], "trace_path": t["trace_path"],
+                         "per_rubric": {r: {"score": rng.randint(1, 10), "notes": "synthetic note for the benchmark", "mode": "rules",
+                                            "key": f"{rng.getrandbits(256):064x}"} for r in RUBRICS}} for t in raw_tests]}
+    report_path = storage.dump_json(report, str(data / "reports" / "bench_report.json"))
+    write_s = time.perf_counter() - t0
+
+    trace_reads = []
+    for path in trace_paths:
+        t = time.perf_counter()
+        storage.load_json(path)
+        trace_reads.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    raw = storage.load_json(raw_path)
+    hydrated = [storage.hydrate_trace(x) for x in raw["tests"]]
+    raw_read = time.perf_counter() - t
+    assert all(h.get("trace") and not h.get("trace_error") for h in hydrated)
+    t = time.perf_counter()
+    storage.load_json(report_path)
+    report_read = time.perf_counter() - t
+
+    traces_b, raw_b, report_b = _size(trace_paths), os.path.getsize(raw_path), os.path.getsize(report_path)
+    return {
+        "bytes": {"traces": traces_b, "raw_results": raw_b, "report": report_b, "total": traces_b + raw_b + report_b},
+        "write_seconds": round(write_s, 3),
+        "read": {"trace": _ms(trace_reads), "raw_results_with_traces_ms": round(raw_read * 1000, 2),
+                 "report_ms": round(report_read * 1000, 2)},
+    }
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--tests", type=int, default=1000)
+    args = p.parse_args()
+
+    modes = [("pretty", "gzip"), ("compact", "gzip")]
+    if storage.zstandard is not None:
+        modes.append(("compact", "zstd"))
+    tmp = tempfile.mkdtemp(prefix="nle_bench_storage_")
+    try:
+        result = {"tests": args.tests}
+        for mode, compression in modes:
+            name = "pretty" if mode == "pretty" else f"compact_{compression}"
+            result[name] = bench_mode(tmp, mode, compression, args.tests)
+        base = result["pretty"]["bytes"]["total"]
+        result["size_ratio_vs_pretty"] = {k: round(v["bytes"]["total"] / base, 3) for k, v in result.items()
+                                          if isinstance(v, dict) and "bytes" in v}
+        if storage.zstandard is None:
+            result["note"] = "zstandard not installed; compact_zstd skipped"
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Suite load time versus suite size: the old path (pure-Python
+`yaml.safe_load` + `TestSuite(**raw)`) against the loader's C YAML parse,
+cold compile (parse + validate + write the cache) and warm cache loads, plus
+streaming all cases with `iter_tests`.
+
+    python bench/suite_load.py --sizes 100 1000 10000 50000
+"""
+import argparse, json, shutil, sys, tempfile, time, tracemalloc
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+import yaml
+from tests import loader
+from tests.schema import TestSuite
+
+def _write_suite(path: Path, n: int):
+    tests = []
+    for i in range(n):
+        tc = {"id": f"t{i}", "prompt": f"Turn on the lights in room {i % 17} and report the thermostat setting.",
+              "grader": ("correctness", "reasoning", "tool_usage", "safety")[i % 4]}
+        if i % 3 == 0:
+            tc["expected_keywords"] = ["lights", "thermostat", str(i % 17)]
+        if i % 5 == 0:
+            tc["expected_tool"] = "lights.set"
+        if i % 11 == 0:
+            tc["must_refuse"] = True
+        tests.append(tc)
+    path.write_text(yaml.safe_dump({"suite": f"synthetic_{n}", "description": "benchmark suite", "tests": tests}, sort_keys=False))
+
+def _timed(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2)
+
+def _peak_kb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak // 1024
+
+def bench_size(tmp: Path, n: int, repeat: int):
+    path = tmp / f"suite_{n}.yaml"
+    _write_suite(path, n)
+    cache_dir = str(tmp / f"cache_{n}")
+
+    def baseline():
+        TestSuite(**yaml.load(path.read_text(), Loader=yaml.SafeLoader))
+
+    def uncached():
+        loader.SUITE_CACHE_DIR = ""
+        loader.load_suite(path)
+
+    def cold():
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        loader.SUITE_CACHE_DIR = cache_dir
+        loader.load_suite(path)
+
+    def warm():
+        loader.SUITE_CACHE_DIR = cache_dir
+        loader.load_suite(path)
+
+    def stream():
+        loader.SUITE_CACHE_DIR = cache_dir
+        for _ in loader.iter_tests(path):
+            pass
+
+    result = {
+        "yaml_bytes": path.stat().st_size,
+        "safe_load_pydantic_ms": _timed(baseline, 1 if n > 10000 else repeat),
+        "c_loader_no_cache_ms": _timed(uncached, repeat),
+        "cold_compile_ms": _timed(cold, repeat),
+        "warm_cache_ms": _timed(warm, repeat),
+        "iter_tests_warm_ms": _timed(stream, repeat),
+        "peak_kb": {"load_suite_warm": _peak_kb(warm), "iter_tests_warm": _peak_kb(stream)},
+    }
+    result["speedup_warm_vs_safe_load"] = round(result["safe_load_pydantic_ms"] / max(result["warm_cache_ms"], 0.01), 1)
+    return result
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    p.add_argument("--repeat", type=int, default=3)
+    args = p.parse_args()
+
+    tmp = Path(tempfile.mkdtemp(prefix="nle_bench_suites_"))
+    try:
+        result = {"c_loader": loader.YAML_LOADER is not yaml.SafeLoader}
+        for n in args.sizes:
+            result[str(n)] = bench_size(tmp, n, args.repeat)
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
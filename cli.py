@@ -3,14 +3,48 @@ from executor.test_executor import run_suite_from_file
 
 def main():
     p = argparse.ArgumentParser()
-    p.add_argument("action", choices=["run-suite"])
-    p.add_argument("--suite", required=True, help="path to suite yaml, e.g. tests/examples/reasoning.yaml")
-    p.add_argument("--archive", required=True, help="path to agent archive, e.g. /data/agents/home_automation_agent.tar.gz")
+    p.add_argument("action", choices=["run-suite", "matrix", "trials"])
+    p.add_argument("--suite", required=True, nargs="+", help="path to suite yaml, e.g. tests/examples/reasoning.yaml (matrix: several, globs allowed)")
+    p.add_argument("--archive", required=True, nargs="+", help="path to agent archive, e.g. /data/agents/home_automation_agent.tar.gz (matrix: several)")
     p.add_argument("--cmd", default="python agent_main.py")
+    p.add_argument("--concurrency", type=int, default=1, help="number of sandbox jobs to run in parallel")
+    p.add_argument("--format", choices=["json", "jsonl"], default=None, help="raw results format; jsonl streams one test per line")
+    p.add_argument("--persistent", action="store_true", default=None,
+                   help="run-suite: serve all tests from long-lived agent processes (line-delimited JSON protocol)")
+    p.add_argument("--grade", action="store_true",
+                   help="run-suite: grade each test as soon as its sandbox job finishes and write the report (pipelined)")
+    p.add_argument("--compare", action="store_true", help="matrix: grade every cell and write the comparison report")
+    p.add_argument("--trials", type=int, default=5, help="trials: max runs per test")
+    p.add_argument("--ci-width", type=float, default=None, help="trials: stop a test once its 95%% CI is this narrow (score points)")
     args = p.parse_args()
-    if args.action == "run-suite":
-        out = run_suite_from_file(args.suite, args.archive, args.cmd)
+    if args.action in ("run-suite", "trials") and (len(args.suite) > 1 or len(args.archive) > 1):
+        p.error(f"{args.action} takes one --suite and one --archive; use matrix for several")
+    if args.action == "run-suite" and args.grade:
+        from evaluation.pipelined import run_pipelined
+        out_json, out_html, raw = run_pipelined(args.suite[0], args.archive[0], args.cmd, concurrency=args.concurrency,
+                                                persistent=args.persistent)
+        print("Wrote raw results:", raw)
+        print("Wrote report:", out_json, out_html)
+    elif args.action == "run-suite":
+        from api.tasks.progress import get_bus
+        get_bus().subscribe(lambda e: print(f"[{e['completed']}/{e['total']}] {e['test_id']} exit={e['exit_code']} {e['duration']}s")
+                            if e["type"] == "test_finished" else None)
+        out = run_suite_from_file(args.suite[0], args.archive[0], args.cmd, concurrency=args.concurrency, raw_format=args.format,
+                                  persistent=args.persistent)
         print("Wrote raw results:", out)
+    elif args.action == "matrix":
+        from executor.matrix_runner import run_matrix
+        out = run_matrix(args.archive, args.suite, args.cmd, concurrency=args.concurrency)
+        print("Wrote matrix manifest:", out)
+        if args.compare:
+            from evaluation.compare import build_comparison_report
+            out_json, out_html = build_comparison_report(out)
+            print("Wrote comparison:", out_json, out_html)
+    elif args.action == "trials":
+        from evaluation.trials import run_trials
+        kwargs = {"ci_width": args.ci_width} if args.ci_width is not None else {}
+        out_json, out_html = run_trials(args.suite[0], args.archive[0], args.cmd, max_trials=args.trials, concurrency=args.concurrency, **kwargs)
+        print("Wrote trials report:", out_json, out_html)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,139 @@
+import os
+import json
+import random
+import argparse
+from pathlib import Path
+from graders.grader_engine import AsyncGrader, GRADING_MODE, GRADING_MODES, GRADER_BATCH_SIZE
+from runner import storage
+from evaluation.evaluation_pipeline import WEIGHTS, REPORTS_DIR, RULE_GRADING, RULE_MODES, build_evaluation_report, test_score, _percentile
+
+BOOTSTRAP_SAMPLES = int(os.environ.get("NLE_BOOTSTRAP_SAMPLES", "2000"))
+CONFIDENCE = 0.95
+# Fewer values than this (or no spread at all) collapse the bootstrap onto a single
+# point, which would mark any nonzero delta significant; no CI is reported then
+MIN_CI_VALUES = int(os.environ.get("NLE_MIN_CI_VALUES", "5"))
+
+def bootstrap_ci(values, samples: int = BOOTSTRAP_SAMPLES, confidence: float = CONFIDENCE, seed: int = 0, min_values: int = MIN_CI_VALUES):
+    """Percentile-bootstrap confidence interval of the mean of `values`; None with too few values or zero variance."""
+    if len(values) < max(1, min_values) or min(values) == max(values):
+        return None
+    rng = random.Random(seed)
+    n = len(values)
+    means = [sum(rng.choices(values, k=n)) / n for _ in range(samples)]
+    tail = (1 - confidence) / 2 * 100
+    return [round(_percentile(means, tail), 2), round(_percentile(means, 100 - tail), 2)]
+
+def _summarise(report: dict):
+    scores = {t["test_id"]: test_score(t["per_rubric"]) for t in report["tests"]}
+    return {
+        "run_id": report["run_id"],
+        "total_score": report["total_score"],
+        "total_score_ci": bootstrap_ci(list(scores.values())),
+        "rubric_avg": report["rubric_avg"],
+    }, scores, {t["test_id"]: t["per_rubric"] for t in report["tests"]}
+
+def _compare(base_scores, base_cells, scores, cells):
+    """Paired comparison on the tests both sides ran: mean delta, its CI and per-rubric deltas."""
+    common = [t for t in base_scores if t in scores]
+    diffs = [scores[t] - base_scores[t] for t in common]
+    ci = bootstrap_ci(diffs)
+    rubric_delta = {}
+    for r in WEIGHTS:
+        pairs = [(cells[t][r]["score"], base_cells[t][r]["score"]) for t in common if r in cells[t] and r in base_cells[t]]
+        rubric_delta[r] = round(sum(a - b for a, b in pairs) / len(pairs), 2) if pairs else None
+    return {
+        "paired_tests": len(common),
+        "total_score_delta": round(sum(diffs) / len(diffs), 2) if diffs else None,
+        "total_score_delta_ci": ci,
+        # The interval excluding zero is our significance test; null when there is no CI
+        "significant": (ci[0] > 0 or ci[1] < 0) if ci else None,
+        "rubric_delta": rubric_delta,
+    }
+
+def build_comparison_report(manifest_path: Path, grader: AsyncGrader = None, mode: str = GRADING_MODE, batch_size: int = GRADER_BATCH_SIZE,
+                            rules: str = RULE_GRADING, baseline: int = 0):
+    """
+    Grades every cell of a matrix run and compares each archive with the
+    `baseline` archive, per suite and over all suites together.
+    Writes <matrix_id>_comparison.json/.html and returns both paths.
+    """
+    manifest = json.loads(Path(manifest_path).read_text())
+    grader = grader or AsyncGrader()
+    archives = [a["archive_path"] for a in manifest["archives"]]
+    base = archives[baseline]
+
+    # archive -> suite path -> (summary, per-test scores, per-test cells); suite names need not be unique
+    graded = {a: {} for a in archives}
+    for cell in manifest["cells"]:
+        out_json, _ = build_evaluation_report(Path(cell["raw_results_path"]), grader=grader, mode=mode, batch_size=batch_size, rules=rules)
+        summary, scores, cells = _summarise(storage.load_json(out_json))
+        graded[cell["archive_path"]][cell["suite_path"]] = ({"suite": cell["suite"], **summary}, scores, cells)
+
+    suites, overall = {}, {}
+    for a in archives:
+        all_scores = {(s, t): v for s, (_, scores, _) in graded[a].items() for t, v in scores.items()}
+        all_cells = {(s, t): v for s, (_, _, cells) in graded[a].items() for t, v in cells.items()}
+        overall[a] = {"total_score": round(sum(all_scores.values()) / len(all_scores), 2) if all_scores else 0,
+                      "total_score_ci": bootstrap_ci(list(all_scores.values())), "_scores": all_scores, "_cells": all_cells}
+        for s, (summary, _, _) in graded[a].items():
+            suites.setdefault(s, {})[a] = dict(summary)
+
+    for s, per_archive in suites.items():
+        for a, summary in per_archive.items():
+            if a != base and s in graded[base]:
+                _, bs, bc = graded[base][s]
+                _, sc, cc = graded[a][s]
+                summary["vs_baseline"] = _compare(bs, bc, sc, cc)
+    for a in archives:
+        if a != base:
+            overall[a]["vs_baseline"] = _compare(overall[base]["_scores"], overall[base]["_cells"], overall[a]["_scores"], overall[a]["_cells"])
+    for a in archives:
+        del overall[a]["_scores"], overall[a]["_cells"]
+
+    report = {
+        "matrix_id": manifest["matrix_id"],
+        "baseline": base,
+        "archives": manifest["archives"],
+        "bootstrap_samples": BOOTSTRAP_SAMPLES,
+        "confidence": CONFIDENCE,
+        "jobs_requested": manifest.get("jobs_requested"),
+        "jobs_executed": manifest.get("jobs_executed"),
+        "overall": overall,
+        "suites": suites,
+        "grader_stats": grader.stats,
+    }
+    out_json = Path(storage.dump_json(report, REPORTS_DIR / f"{manifest['matrix_id']}_comparison.json"))
+
+    parts = [f"<html><head><meta charset='utf-8'><title>Comparison {report['matrix_id']}</title></head><body style='font-family:sans-serif'>",
+             f"<h1>Agent Comparison — {report['matrix_id']}</h1><p>Baseline: <code>{base}</code>; "
+             f"{int(CONFIDENCE * 100)}% bootstrap CIs over {BOOTSTRAP_SAMPLES} resamples.</p>"]
+    for title, rows in [("All suites", overall), *suites.items()]:
+        parts.append(f"<h2>{title}</h2><table border='1' cellpadding='4'><tr><th>Archive</th><th>Total</th><th>CI</th>"
+                     f"<th>Δ vs baseline</th><th>Δ CI</th>{''.join(f'<th>Δ {r}</th>' for r in WEIGHTS)}</tr>")
+        for a, row in rows.items():
+            cmp = row.get("vs_baseline") or {}
+            mark = " *" if cmp.get("significant") else ""
+            deltas = "".join(f"<td>{(cmp.get('rubric_delta') or {}).get(r, '—')}</td>" for r in WEIGHTS)
+            parts.append(f"<tr><td>{a}</td><td>{row['total_score']}</td><td>{row['total_score_ci']}</td>"
+                         f"<td>{cmp.get('total_score_delta', '—')}{mark}</td><td>{cmp.get('total_score_delta_ci', '—')}</td>{deltas}</tr>")
+        parts.append("</table>")
+    parts.append(f"<p>* the delta's confidence interval excludes zero. No CI (None) with fewer than {MIN_CI_VALUES} paired tests "
+                 "or identical values.</p></body></html>")
+    out_html = REPORTS_DIR / f"{manifest['matrix_id']}_comparison.html"
+    out_html.write_text("".join(parts))
+    return out_json, out_html
+
+def main():
+    p = argparse.ArgumentParser(description="Grade a matrix run and compare agents")
+    p.add_argument("--matrix", required=True, help="path to <matrix_id>_matrix.json")
+    p.add_argument("--baseline", type=int, default=0, help="index of the baseline archive")
+    p.add_argument("--grading-mode", choices=GRADING_MODES, default=GRADING_MODE)
+    p.add_argument("--batch-size", type=int, default=GRADER_BATCH_SIZE)
+    p.add_argument("--rules", choices=RULE_MODES, default=RULE_GRADING)
+    args = p.parse_args()
+    out_json, out_html = build_comparison_report(Path(args.matrix), mode=args.grading_mode, batch_size=args.batch_size,
+                                                 rules=args.rules, baseline=args.baseline)
+    print(f"Comparison written:\nJSON: {out_json}\nHTML: {out_html}")
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,17 @@
 import argparse
+import asyncio
+import hashlib
 import json
+import shutil
+import tempfile
 from pathlib import Path
-from graders.grader_engine import grade
+from graders.grader_engine import (grade, AsyncGrader, GRADING_MODE, GRADING_MODES, GRADER_BATCH_SIZE,
+                                   CACHE_KEY_VERSION, GEMINI_MODEL, template_hash)
+from graders.grader_cache import get_cache
+from graders.rule_grader import grade_rules, RULES_VERSION
+from api.tasks.run_index import record_report
+from api.tasks.progress import publish
+from runner import storage
 import statistics
 import time
 import os
@@ -19,17 +29,21 @@ WEIGHTS = {
 DATA_DIR = Path(os.environ.get("NLE_DATA_DIR", "/data"))
 REPORTS_DIR = DATA_DIR / "reports"
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+# "off": LLM only, "prefilter": skip the LLM where the rule grader is decisive,
+# "only": rule grader for everything (offline)
+RULE_MODES = ("off", "prefilter", "only")
+RULE_GRADING = os.environ.get("NLE_RULE_GRADING", "off")
 
-def grade_testcase(test):
+def rubric_inputs(test):
     """
-    Runs all rubrics against a single test case.
+    Builds the (rubric, prompt, response, expected) grading inputs for a test case.
     """
     prompt = test.get("prompt")
     trace = test.get("trace", {})
     response = trace.get("stdout_snippet", "")
     
     # Handle expected output format
-    tc_expected = test.get("expected", None)
+    tc_expected = test.get("expected", test.get("expected_keywords"))
     expected_keywords = None
     if isinstance(tc_expected, (list, dict)):
         expected_keywords = json.dumps(tc_expected)
@@ -39,7 +53,7 @@ def grade_testcase(test):
     # For tool usage, we look at the structured tool calls
     tool_text = json.dumps(trace.get("tool_calls", []))
 
-    results = {}
+    inputs = []
     # Run every rubric for every test to get a complete profile
     for rubric in WEIGHTS.keys():
         if rubric == "tool_usage":
@@ -48,12 +62,84 @@ def grade_testcase(test):
         else:
             eval_in = response
             exp = expected_keywords or test.get("expected", "")
-            
+        inputs.append((rubric, prompt, eval_in, str(exp or "")))
+    return inputs
+
+# Extra templates a grading mode renders on top of the rubric's own
+_MODE_TEMPLATES = {"combined": ("combined",), "batched": ("batch",)}
+
+# Test fields besides the trace that a grader reads (rule_grader: must_refuse, expected_*)
+_EXPECTATION_FIELDS = ("prompt", "expected", "expected_keywords", "expected_tool", "must_refuse")
+
+def cell_keys(test, mode: str = GRADING_MODE, rules: str = RULE_GRADING):
+    """
+    Dependency key of every (test, rubric) cell: a hash of the whole trace and
+    the test's expectation fields, the rubric's template(s), the model and the
+    rule-grading setup. A cell whose key is unchanged since an earlier report
+    can reuse that report's result.
+    """
+    inputs = json.dumps({"trace": test.get("trace", {}), **{f: test.get(f) for f in _EXPECTATION_FIELDS}},
+                        sort_keys=True, default=str)
+    inputs_hash = hashlib.sha256(inputs.encode("utf-8")).hexdigest()
+    keys = {}
+    for rubric in WEIGHTS:
+        if rules == "only":
+            deps = ["rules", RULES_VERSION]
+        else:
+            deps = [CACHE_KEY_VERSION, GEMINI_MODEL, mode, template_hash(rubric),
+                    *(template_hash(t) for t in _MODE_TEMPLATES.get(mode, ())),
+                    rules, RULES_VERSION if rules != "off" else ""]
+        raw = "|".join([*deps, rubric, inputs_hash])
+        keys[rubric] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    return keys
+
+def grade_testcase(test):
+    """
+    Runs all rubrics against a single test case.
+    """
+    results = {}
+    for rubric, prompt, eval_in, exp in rubric_inputs(test):
         # Call the grader engine
-        g = grade(rubric, prompt, eval_in, str(exp or ""))
-        results[rubric] = g
+        results[rubric] = grade(rubric, prompt, eval_in, exp)
     return results
 
+async def grade_testcases_async(tests, grader: AsyncGrader = None, mode: str = GRADING_MODE, batch_size: int = GRADER_BATCH_SIZE, rules: str = RULE_GRADING,
+                                reuse=None):
+    """
+    Fans out every rubric x test call through one AsyncGrader.
+    Returns per-rubric results in the same order as `tests`; each result
+    records the mode ("per_rubric", "combined", "batched" or "rules") that produced it.
+    With rules="prefilter" cells the rule grader decides are never sent to the LLM.
+    `reuse` (one {rubric: result} dict per test) supplies cells that are already graded.
+    """
+    reuse = reuse or [{} for _ in tests]
+    ruled = [grade_rules(tc, tuple(r for r in WEIGHTS if r not in done)) if rules != "off" else {}
+             for tc, done in zip(tests, reuse)]
+    decided = [{**{r: {"score": v["score"], "notes": v["notes"], "mode": "rules"}
+                   for r, v in rr.items() if rules == "only" or v["decisive"]}, **done}
+               for rr, done in zip(ruled, reuse)]
+    if rules == "only":
+        return decided
+
+    grader = grader or AsyncGrader()
+    items = [[i for i in rubric_inputs(tc) if i[0] not in done] for tc, done in zip(tests, decided)]
+    if mode == "combined":
+        llm = await asyncio.gather(*(grader.grade_combined(per_test) for per_test in items if per_test))
+        llm_iter = iter(llm)
+        llm = [next(llm_iter) if per_test else {} for per_test in items]
+    else:
+        flat_items = [i for per_test in items for i in per_test]
+        if mode == "batched":
+            flat = await grader.grade_batched(flat_items, batch_size)
+        else:
+            flat = await grader.grade_many(flat_items)
+        llm, pos = [], 0
+        for per_test in items:
+            # Cached entries keep the mode that originally produced them
+            llm.append({i[0]: {"mode": "per_rubric", **flat[pos + n]} for n, i in enumerate(per_test)})
+            pos += len(per_test)
+    return [{r: done.get(r) or res[r] for r in WEIGHTS} for done, res in zip(decided, llm)]
+
 def aggregate_scores(per_test_scores):
     """
     Calculates averages and the final weighted composite score (0-100).
@@ -81,83 +167,301 @@ def aggregate_scores(per_test_scores):
         "total_score": total_score
     }
 
-def build_evaluation_report(raw_results_path: Path):
-    data = json.loads(raw_results_path.read_text())
-    run_id = data.get("run_id") or raw_results_path.stem
-    
-    print(f"Starting evaluation for Run ID: {run_id}")
-    
-    per_test_scores = []
-    for tc in data.get("tests", []):
-        print(f"  Grading test: {tc.get('test_id')}...")
-        per_rubric = grade_testcase(tc)
-        per_test_scores.append({
+def _percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list (pct in 0..100)."""
+    vals = sorted(values)
+    k = (len(vals) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(vals) - 1)
+    return vals[lo] + (vals[hi] - vals[lo]) * (k - lo)
+
+def _usage_summary(values: dict):
+    """
+    Per-suite p50/p95/p99/max of each resource metric (wall time, CPU seconds,
+    peak RSS from the traces' "resources" blocks). Metrics with no values are omitted.
+    """
+    usage = {}
+    for metric, vals in values.items():
+        if not vals:
+            continue
+        usage[metric] = {
+            "count": len(vals),
+            **{f"p{p}": round(_percentile(vals, p), 3) for p in (50, 95, 99)},
+            "max": max(vals),
+        }
+    return usage
+
+def _previous_cells(report_path: Path):
+    """Maps cell key -> per-rubric result for every keyed cell of an earlier report."""
+    try:
+        report = storage.load_json(report_path)
+    except (OSError, ValueError):
+        return {}
+    # Failed cells (and ones from reports written before failures were flagged) are graded again
+    return {v["key"]: v for t in report.get("tests", []) for v in t.get("per_rubric", {}).values()
+            if isinstance(v, dict) and v.get("key") and not v.get("error") and not str(v.get("notes", "")).startswith("API Error")}
+
+# Tests graded per step when streaming a .jsonl raw results file
+STREAM_CHUNK_SIZE = int(os.environ.get("NLE_STREAM_CHUNK_SIZE", "50"))
+_RESOURCE_METRICS = ("wall_seconds", "cpu_seconds", "peak_rss_bytes")
+
+def iter_raw_results(raw_results_path: Path):
+    """
+    Returns (header, tests) for a raw results file. For .jsonl files (a header
+    line, then one test per line) `tests` is a lazy iterator, so only the tests
+    being graded are in memory; legacy .json files are loaded whole.
+    Compressed files are decoded and referenced traces loaded back in.
+    """
+    if not storage.base_name(raw_results_path).endswith(".jsonl"):
+        data = storage.load_json(raw_results_path)
+        return {k: v for k, v in data.items() if k != "tests"}, map(storage.hydrate_trace, data.get("tests", []))
+    f = storage.open_text(raw_results_path)
+    first = f.readline()
+    header = json.loads(first) if first.strip() else {}
+    pending = []
+    if "test_id" in header:
+        pending, header = [header], {}
+
+    def tests():
+        with f:
+            yield from map(storage.hydrate_trace, pending)
+            for line in f:
+                if line.strip():
+                    yield storage.hydrate_trace(json.loads(line))
+    return header, tests()
+
+def test_score(per_rubric: dict) -> float:
+    """Weighted composite (0-100) of one test; the report's total_score is the mean of these."""
+    return sum(v.get("score", 0) / 10.0 * WEIGHTS.get(r, 0) for r, v in per_rubric.items()) * 100
+
+def _chunks(it, size: int):
+    chunk = []
+    for item in it:
+        chunk.append(item)
+        if size and len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class RunningAggregate:
+    """
+    Report totals accumulated test by test, so graded tests can be written
+    out and dropped. Only the three resource metrics are kept per test,
+    since percentiles need every value.
+    """
+
+    def __init__(self):
+        self.tests = 0
+        self.sums = {r: 0.0 for r in WEIGHTS}
+        self.counts = {r: 0 for r in WEIGHTS}
+        self.mode_counts = {}
+        self.resources = {m: [] for m in _RESOURCE_METRICS}
+        self.reused = 0
+        self.tests_regraded = 0
+        self.agent_archive = None
+
+    def add(self, tc: dict, entry: dict, reused: int = 0):
+        self.tests += 1
+        trace = tc.get("trace") or {}
+        if self.agent_archive is None:
+            # Matrix cells name their own archive; a deduped trace may come from an identical one
+            self.agent_archive = tc.get("archive_path") or trace.get("archive_path", "")
+        for r, v in entry["per_rubric"].items():
+            self.sums[r] += v.get("score", 0)
+            self.counts[r] += 1
+            m = v.get("mode", "per_rubric")
+            self.mode_counts[m] = self.mode_counts.get(m, 0) + 1
+        res = trace.get("resources") or {}
+        for m in _RESOURCE_METRICS:
+            if res.get(m) is not None:
+                self.resources[m].append(res[m])
+        self.reused += reused
+        self.tests_regraded += reused < len(WEIGHTS)
+
+    def scores(self):
+        rubric_avg = {r: round(self.sums[r] / self.counts[r], 2) if self.counts[r] else 0 for r in WEIGHTS}
+        composite = sum((avg / 10.0) * WEIGHTS.get(r, 0) for r, avg in rubric_avg.items())
+        return {"rubric_avg": rubric_avg, "total_score": round(composite * 100, 2)}
+
+    def resource_usage(self):
+        return _usage_summary(self.resources)
+
+_HTML_STYLE = (
+    "<style>body{font-family:sans-serif; max-width:800px; margin:20px auto; padding:20px;} "
+    "h1{color:#333;} .score{font-size:2em; font-weight:bold; color:#007bff;} "
+    ".rubric{margin-bottom:10px;} .test-case{border:1px solid #ddd; padding:15px; margin-bottom:15px; border-radius:5px;}</style>"
+)
+
+def _html_summary(report: dict) -> str:
+    parts = [f"<html><head><meta charset='utf-8'><title>Evaluation {report['run_id']}</title>", _HTML_STYLE, "</head><body>",
+             f"<h1>Evaluation Report — {report['run_id']}</h1>",
+             f"<p><strong>Total Composite Score:</strong> <span class='score'>{report['total_score']}/100</span></p>",
+             "<h2>Rubric Averages (1-10)</h2><ul>"]
+    for r, a in report["rubric_avg"].items():
+        parts.append(f"<li class='rubric'><strong>{r.capitalize()}:</strong> {a} (Weight: {WEIGHTS[r]})</li>")
+    parts.append("</ul>")
+    if report["resource_usage"]:
+        parts.append("<h2>Resource Usage</h2><table border='1' cellpadding='4'><tr><th>Metric</th><th>p50</th><th>p95</th><th>p99</th><th>max</th></tr>")
+        for m, v in report["resource_usage"].items():
+            parts.append(f"<tr><td>{m}</td><td>{v['p50']}</td><td>{v['p95']}</td><td>{v['p99']}</td><td>{v['max']}</td></tr>")
+        parts.append("</table>")
+    parts.append("<h2>Detailed Test Results</h2>")
+    return "".join(parts)
+
+def _html_test(t: dict) -> str:
+    parts = [f"<div class='test-case'><h3>Test ID: {t['test_id']}</h3>", f"<small>Job ID: {t['job_id']}</small><ul>"]
+    for r, val in t["per_rubric"].items():
+        parts.append(f"<li><strong>{r}:</strong> {val.get('score', 0)} — <i>{val.get('notes','')}</i> <small>[{val.get('mode', 'per_rubric')}]</small></li>")
+    parts.append("</ul></div>")
+    return "".join(parts)
+
+_HTML_FOOT = "<hr><p>Reference design document: <code>/mnt/data/Untitled document.pdf</code></p></body></html>"
+
+def _assemble(out_path: Path, head: str, part, tail: str, compressed: bool = None):
+    # open_write renames into place on close, so readers never see a half-written report
+    part.seek(0)
+    with storage.open_write(out_path, compressed) as f:
+        f.write(head)
+        shutil.copyfileobj(part, f)
+        f.write(tail)
+    return Path(f.final)
+
+async def grade_chunk(chunk, grader, mode, batch_size, rules, prior, agg: RunningAggregate, json_part, html_part, channel: str = None):
+    """Grades a list of raw-results tests, spools their report entries to the part files and adds them to `agg`."""
+    sep, separators = (",", (",", ":")) if storage.compact() else (",\n    ", None)
+    keys = [cell_keys(tc, mode, rules) for tc in chunk]
+    reuse = [{r: prior[k] for r, k in tk.items() if k in prior} for tk in keys] if prior is not None else None
+    if reuse and mode == "combined":
+        # One combined prompt grades a test's rubrics together: reuse all of them or none
+        reuse = [done if len(done) == len(WEIGHTS) else {} for done in reuse]
+    graded = await grade_testcases_async(chunk, grader, mode, batch_size, rules, reuse)
+    for i, (tc, per_rubric, tk) in enumerate(zip(chunk, graded, keys)):
+        entry = {
             "test_id": tc.get("test_id"),
             "job_id": tc.get("job_id"),
             "trace_path": tc.get("trace_path"),
-            "per_rubric": per_rubric
-        })
+            "per_rubric": {r: {**v, "key": tk[r]} for r, v in per_rubric.items()}
+        }
+        json_part.write(("" if agg.tests == 0 else sep) + json.dumps(entry, separators=separators))
+        html_part.write(_html_test(entry))
+        agg.add(tc, entry, len(reuse[i]) if reuse else 0)
+        publish(channel, "test_graded", test_id=entry["test_id"], job_id=entry["job_id"], score=round(test_score(per_rubric), 2),
+                per_rubric={r: v.get("score") for r, v in per_rubric.items()}, graded=agg.tests, partial=agg.scores())
 
-    agg = aggregate_scores(per_test_scores)
-    
+async def _grade_stream(chunks, grader, mode, batch_size, rules, prior, agg: RunningAggregate, json_part, html_part, channel: str = None):
+    for chunk in chunks:
+        await grade_chunk(chunk, grader, mode, batch_size, rules, prior, agg, json_part, html_part, channel)
+
+def write_report(run_id: str, suite: str, agg: RunningAggregate, grader: AsyncGrader, mode: str, rules: str, json_part, html_part,
+                 prior=None, previous_report: Path = None, channel: str = None, **extra):
+    """
+    Writes <run_id>_report.json/.html from the running aggregate and the
+    spooled per-test entries, indexes it and publishes grading_end.
+    `extra` fields go into the report ahead of the tests.
+    """
     report = {
         "run_id": run_id,
-        "agent_archive": data.get("tests", [{}])[0].get("trace", {}).get("archive_path", ""),
-        "total_score": agg["total_score"],
-        "rubric_avg": agg["rubric_avg"],
-        "tests": per_test_scores,
+        "suite": suite,
+        "agent_archive": agg.agent_archive or "",
+        **agg.scores(),
+        "test_count": agg.tests,
         "generated_at": time.time(),
-        "weights": WEIGHTS
+        "weights": WEIGHTS,
+        "grading_mode": mode,
+        "rule_grading": rules,
+        "mode_counts": agg.mode_counts,
+        "resource_usage": agg.resource_usage(),
+        "incremental": {
+            "previous_report": str(previous_report) if prior is not None else None,
+            "cells_reused": agg.reused,
+            "cells_recomputed": agg.tests * len(WEIGHTS) - agg.reused,
+            "tests_regraded": agg.tests_regraded,
+        },
+        "grader_stats": {**grader.stats, "cache": dict(get_cache().stats)},
+        **extra,
     }
 
     # FIX: Updated filenames to match API expectations (_report.json)
     out_json = REPORTS_DIR / f"{run_id}_report.json"
     out_html = REPORTS_DIR / f"{run_id}_report.html"
+
+    # Per-test entries were spooled to the part files as they were graded
+    if storage.compact():
+        out_json = _assemble(out_json, json.dumps(report, separators=(",", ":"))[:-1] + ',"tests":[', json_part, "]}")
+    else:
+        head = json.dumps(report, indent=2)
+        out_json = _assemble(out_json, head[:-2] + ',\n  "tests": [\n    ', json_part, "\n  ]\n}")
+    # HTML stays uncompressed so it can be served as-is
+    _assemble(out_html, _html_summary(report), html_part, _HTML_FOOT, compressed=False)
+    record_report(report, out_json)
+    publish(channel, "grading_end", run_id=run_id, total_score=report["total_score"], rubric_avg=report["rubric_avg"],
+            test_count=agg.tests, report_json=str(out_json))
+    return out_json, out_html
+
+def build_evaluation_report(raw_results_path: Path, grader: AsyncGrader = None, mode: str = GRADING_MODE, batch_size: int = GRADER_BATCH_SIZE, rules: str = RULE_GRADING,
+                            incremental: bool = False, previous_report: Path = None, chunk_size: int = None, progress: str = None):
+    """
+    Grades a raw results file and writes <run_id>_report.json/.html.
+    A .jsonl raw results file is streamed: tests are read, graded and written
+    `chunk_size` at a time with only running aggregates kept in memory.
+    A legacy .json file is graded in one pass.
+    With `incremental` (or an explicit `previous_report`) cells whose key is
+    unchanged since that report are reused and only the rest are re-graded;
+    aggregates are always recomputed. Defaults to the run's existing report.
+    Each graded test and the running score are published on the `progress`
+    channel (default: the run id).
+    """
+    raw_results_path = Path(raw_results_path)
+    header, tests = iter_raw_results(raw_results_path)
+    run_id = header.get("run_id") or Path(storage.base_name(raw_results_path)).stem
+    streaming = storage.base_name(raw_results_path).endswith(".jsonl")
+    channel = progress or run_id
+    if chunk_size is None:
+        # Chunking a loaded file too lets progress arrive while the rest is graded
+        chunk_size = STREAM_CHUNK_SIZE if streaming or progress else 0
     
-    # Write JSON
-    out_json.write_text(json.dumps(report, indent=2))
-
-    # Write HTML Report
-    html = f"<html><head><meta charset='utf-8'><title>Evaluation {run_id}</title>"
-    html += "<style>body{font-family:sans-serif; max-width:800px; margin:20px auto; padding:20px;} "
-    html += "h1{color:#333;} .score{font-size:2em; font-weight:bold; color:#007bff;} "
-    html += ".rubric{margin-bottom:10px;} .test-case{border:1px solid #ddd; padding:15px; margin-bottom:15px; border-radius:5px;}</style>"
-    html += "</head><body>"
-    
-    html += f"<h1>Evaluation Report — {run_id}</h1>"
-    html += f"<p><strong>Total Composite Score:</strong> <span class='score'>{report['total_score']}/100</span></p>"
-    
-    html += "<h2>Rubric Averages (1-10)</h2><ul>"
-    for r, a in report["rubric_avg"].items():
-        html += f"<li class='rubric'><strong>{r.capitalize()}:</strong> {a} (Weight: {WEIGHTS[r]})</li>"
-    html += "</ul>"
-    
-    html += "<h2>Detailed Test Results</h2>"
-    for t in report["tests"]:
-        html += f"<div class='test-case'><h3>Test ID: {t['test_id']}</h3>"
-        html += f"<small>Job ID: {t['job_id']}</small><ul>"
-        for r, val in t["per_rubric"].items():
-            html += f"<li><strong>{r}:</strong> {val.get('score', 0)} — <i>{val.get('notes','')}</i></li>"
-        html += "</ul></div>"
-        
-    html += "<hr>"
-    html += f"<p>Reference design document: <code>/mnt/data/Untitled document.pdf</code></p>"
-    html += "</body></html>"
+    print(f"Starting evaluation for Run ID: {run_id}")
     
-    out_html.write_text(html)
-    return out_json, out_html
+    prior = None
+    if incremental or previous_report:
+        previous_report = Path(previous_report or REPORTS_DIR / f"{run_id}_report.json")
+        prior = _previous_cells(previous_report)
+    print(f"  Grading {'streamed ' if streaming else ''}tests x {len(WEIGHTS)} rubrics ({mode}, rules={rules}"
+          f"{', incremental' if prior is not None else ''})...")
+    grader = grader or AsyncGrader()
+    agg = RunningAggregate()
+    publish(channel, "grading_start", run_id=run_id, suite=header.get("suite"), mode=mode, rules=rules)
+    with tempfile.TemporaryFile("w+", encoding="utf-8", dir=REPORTS_DIR) as json_part, \
+            tempfile.TemporaryFile("w+", encoding="utf-8", dir=REPORTS_DIR) as html_part:
+        asyncio.run(_grade_stream(_chunks(tests, chunk_size), grader, mode, batch_size, rules, prior, agg, json_part, html_part, channel))
+
+        return write_report(run_id, header.get("suite"), agg, grader, mode, rules, json_part, html_part, prior, previous_report, channel)
 
 def main():
     p = argparse.ArgumentParser()
     # FIX: Changed argument to --data to match api/main.py
     p.add_argument("--data", required=True, help="Path to raw results JSON")
+    p.add_argument("--concurrency", type=int, default=None, help="max in-flight grader requests")
+    p.add_argument("--rps", type=float, default=None, help="max grader requests per second (0 = unlimited)")
+    p.add_argument("--grading-mode", choices=GRADING_MODES, default=GRADING_MODE, help="one call per rubric, one combined call per test, or batches of tests per rubric")
+    p.add_argument("--batch-size", type=int, default=GRADER_BATCH_SIZE, help="tests per call in batched mode")
+    p.add_argument("--rules", choices=RULE_MODES, default=RULE_GRADING, help="use the local rule grader as a pre-filter, or exclusively (offline)")
+    p.add_argument("--incremental", action="store_true", help="reuse unchanged cells from this run's existing report")
+    p.add_argument("--previous", default=None, help="earlier report JSON to reuse unchanged cells from")
     args = p.parse_args()
     
     raw = Path(args.data)
     if not raw.exists():
         raise SystemExit(f"Raw results file not found: {raw}")
-        
-    out_json, out_html = build_evaluation_report(raw)
+
+    grader_kwargs = {}
+    if args.concurrency is not None:
+        grader_kwargs["concurrency"] = args.concurrency
+    if args.rps is not None:
+        grader_kwargs["rps"] = args.rps
+    out_json, out_html = build_evaluation_report(raw, grader=AsyncGrader(**grader_kwargs), mode=args.grading_mode, batch_size=args.batch_size, rules=args.rules,
+                                                incremental=args.incremental, previous_report=args.previous)
     print(f"\nSuccess! Reports generated:\nJSON: {out_json}\nHTML: {out_html}")
 
 if __name__ == "__main__":
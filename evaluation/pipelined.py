@@ -0,0 +1,159 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import argparse
+import itertools
+import tempfile
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from executor.test_executor import RAW_JSONL_FORMAT, PERSISTENT_AGENT, run_tracked
+from graders.grader_engine import AsyncGrader, GRADING_MODE, GRADING_MODES, GRADER_BATCH_SIZE
+from evaluation.evaluation_pipeline import (REPORTS_DIR, RULE_GRADING, RULE_MODES, STREAM_CHUNK_SIZE, RunningAggregate,
+                                            grade_chunk, write_report)
+from api.tasks.progress import publish
+from runner import storage
+from tests.loader import load_suite
+
+# Finished traces waiting for a grader; a full queue holds the sandbox slots back
+PIPELINE_QUEUE_SIZE = int(os.environ.get("NLE_PIPELINE_QUEUE_SIZE", "16"))
+PIPELINE_GRADERS = int(os.environ.get("NLE_PIPELINE_GRADERS", "2"))
+
+class PipelinedRun:
+    """
+    Runs a suite's sandbox jobs and grades them at the same time: each
+    finished test goes through a bounded queue to `grade_workers` grading
+    tasks, which take whatever is waiting (up to `chunk_size`) and grade it
+    as one chunk. When the queue is full, sandbox slots wait before starting
+    their next test, so at most concurrency + queue_size finished traces are
+    held ungraded. Raw results (.jsonl) and report entries are written in
+    completion order.
+    """
+
+    def __init__(self, archive_path: str, cmd: str = "python agent_main.py", concurrency: int = 1, grade_workers: int = PIPELINE_GRADERS,
+                 queue_size: int = PIPELINE_QUEUE_SIZE, chunk_size: int = STREAM_CHUNK_SIZE, grader: AsyncGrader = None,
+                 mode: str = GRADING_MODE, batch_size: int = GRADER_BATCH_SIZE, rules: str = RULE_GRADING, persistent: bool = None):
+        self.archive_path = archive_path
+        self.cmd = cmd
+        self.concurrency = max(1, concurrency)
+        self.grade_workers = max(1, grade_workers)
+        self.queue_size = max(1, queue_size)
+        self.chunk_size = max(1, chunk_size)
+        self.grader = grader or AsyncGrader()
+        self.mode = mode
+        self.batch_size = batch_size
+        self.rules = rules
+        self.persistent = PERSISTENT_AGENT if persistent is None else persistent
+        self.stats = {"producer_wait_seconds": 0.0, "max_queue_depth": 0, "grade_chunks": 0}
+
+    async def _sandbox_slot(self, pool, tests, total, queue, raw_out, agents, channel, completed):
+        loop = asyncio.get_running_loop()
+        for i, tc in tests:
+            raw = await loop.run_in_executor(pool, run_tracked, tc, i, total, self.archive_path, self.cmd, agents, channel, completed)
+            # Compact mode stores a trace reference instead of a second copy of the trace
+            raw_out.write(json.dumps(storage.ref_trace(raw)) + "\n")
+            t0 = time.monotonic()
+            await queue.put(raw)
+            self.stats["producer_wait_seconds"] += time.monotonic() - t0
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], queue.qsize())
+
+    async def _grading_worker(self, queue, agg, json_part, html_part, channel):
+        while True:
+            chunk = [await queue.get()]
+            while chunk[-1] is not None and len(chunk) < self.chunk_size and not queue.empty():
+                chunk.append(queue.get_nowait())
+            done = chunk[-1] is None
+            if done:
+                chunk.pop()
+            if chunk:
+                self.stats["grade_chunks"] += 1
+                await grade_chunk(chunk, self.grader, self.mode, self.batch_size, self.rules, None, agg, json_part, html_part, channel)
+            if done:
+                return
+
+    async def run_async(self, suite, total, raw_out, agg, json_part, html_part, channel, agents=None):
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        tests = iter(enumerate(suite.tests))
+        completed = itertools.count(1)
+        workers = max(1, min(self.concurrency, total or 1))
+        try:
+            # A failing grader cancels everything else; otherwise sandbox slots would wait
+            # forever on the full queue and the run would hang instead of failing
+            async with asyncio.TaskGroup() as tg:
+                graders = [tg.create_task(self._grading_worker(queue, agg, json_part, html_part, channel))
+                           for _ in range(self.grade_workers)]
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nle_pipelined") as pool:
+                    # The slots share one iterator, so each test is started exactly once
+                    slots = [tg.create_task(self._sandbox_slot(pool, tests, total, queue, raw_out, agents, channel, completed))
+                             for _ in range(workers)]
+                    await asyncio.wait(slots)
+                sandbox_done = time.monotonic()
+                for _ in graders:
+                    await queue.put(None)
+        except BaseExceptionGroup as eg:
+            raise eg.exceptions[0]
+        return sandbox_done
+
+def run_pipelined(suite_path: str, archive_path: str, cmd: str = "python agent_main.py", progress: str = None, **kwargs):
+    """
+    Pipelined mode: runs and grades a suite in one pass (see PipelinedRun)
+    and writes <run_id>_raw_results.jsonl plus <run_id>_report.json/.html.
+    Progress goes out on the `progress` channel (default: the run id).
+    """
+    suite = load_suite(suite_path)
+    runner = PipelinedRun(archive_path, cmd, **kwargs)
+    run_id = str(uuid.uuid4())
+    channel = progress or run_id
+    total = len(suite.tests)
+    agents = None
+    if runner.persistent:
+        from runner.persistent_agent import PersistentAgentPool
+        agents = PersistentAgentPool(archive_path, cmd, size=min(runner.concurrency, total or 1))
+
+    publish(channel, "run_start", run_id=run_id, suite=suite.suite, total=total, pipelined=True)
+    for i, tc in enumerate(suite.tests):
+        publish(channel, "test_queued", test_id=tc.id, index=i)
+    publish(channel, "grading_start", run_id=run_id, suite=suite.suite, mode=runner.mode, rules=runner.rules)
+    agg = RunningAggregate()
+    t0 = time.monotonic()
+    try:
+        with tempfile.TemporaryFile("w+", encoding="utf-8", dir=REPORTS_DIR) as json_part, \
+                tempfile.TemporaryFile("w+", encoding="utf-8", dir=REPORTS_DIR) as html_part:
+            with storage.open_write(REPORTS_DIR / f"{run_id}_raw_results.jsonl") as raw_out:
+                raw_out.write(json.dumps({"format": RAW_JSONL_FORMAT, "run_id": run_id, "suite": suite.suite}) + "\n")
+                sandbox_done = asyncio.run(runner.run_async(suite, total, raw_out, agg, json_part, html_part, channel, agents))
+            publish(channel, "run_end", run_id=run_id, raw_results_path=str(raw_out.final), total=total)
+            pipelined = {
+                "sandbox_concurrency": runner.concurrency,
+                "grade_workers": runner.grade_workers,
+                "queue_size": runner.queue_size,
+                "sandbox_seconds": round(sandbox_done - t0, 3),
+                # Grading still running after the last sandbox job finished
+                "grading_tail_seconds": round(time.monotonic() - sandbox_done, 3),
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in runner.stats.items()},
+            }
+            out_json, out_html = write_report(run_id, suite.suite, agg, runner.grader, runner.mode, runner.rules, json_part, html_part,
+                                              channel=channel, pipelined=pipelined, raw_results_path=raw_out.final)
+    finally:
+        if agents:
+            agents.close()
+    return out_json, out_html, Path(raw_out.final)
+
+def main():
+    p = argparse.ArgumentParser(description="Run a suite and grade each test as soon as its sandbox job finishes")
+    p.add_argument("--suite", required=True)
+    p.add_argument("--archive", required=True)
+    p.add_argument("--cmd", default="python agent_main.py")
+    p.add_argument("--concurrency", type=int, default=1, help="sandbox jobs in parallel")
+    p.add_argument("--graders", type=int, default=PIPELINE_GRADERS, help="grading tasks pulling from the queue")
+    p.add_argument("--queue-size", type=int, default=PIPELINE_QUEUE_SIZE, help="finished traces allowed to wait for a grader")
+    p.add_argument("--grading-mode", choices=GRADING_MODES, default=GRADING_MODE)
+    p.add_argument("--rules", choices=RULE_MODES, default=RULE_GRADING)
+    args = p.parse_args()
+    out_json, out_html, raw = run_pipelined(args.suite, args.archive, args.cmd, concurrency=args.concurrency, grade_workers=args.graders,
+                                            queue_size=args.queue_size, mode=args.grading_mode, rules=args.rules)
+    print(f"Pipelined run:\nRaw results: {raw}\nJSON: {out_json}\nHTML: {out_html}")
+
+if __name__ == "__main__":
+    main()
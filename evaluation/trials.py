@@ -0,0 +1,180 @@
+import os
+import math
+import time
+import uuid
+import asyncio
+import argparse
+import statistics
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from executor.test_executor import run_test_case
+from graders.grader_engine import AsyncGrader, GRADING_MODE, GRADING_MODES, GRADER_BATCH_SIZE
+from graders.grader_cache import get_cache
+from evaluation.evaluation_pipeline import (WEIGHTS, REPORTS_DIR, RULE_GRADING, RULE_MODES, grade_testcases_async,
+                                            _usage_summary, _html_summary, _html_test, _HTML_FOOT)
+from evaluation.compare import test_score, bootstrap_ci
+from api.tasks.run_index import record_report
+from runner import storage
+from tests.loader import load_suite
+
+MAX_TRIALS = int(os.environ.get("NLE_MAX_TRIALS", "5"))
+MIN_TRIALS = int(os.environ.get("NLE_MIN_TRIALS", "2"))
+# Stop a test once its 95% CI on the composite score (0-100) is at most this wide
+TRIAL_CI_WIDTH = float(os.environ.get("NLE_TRIAL_CI_WIDTH", "10"))
+
+# Two-sided 95% Student t critical values by degrees of freedom; 1.96 beyond the table
+_T95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+        2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+        2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+
+def mean_ci(values):
+    """(mean, variance, [lo, hi]) with a t-based 95% interval; the interval is None for a single value."""
+    mean = statistics.fmean(values)
+    if len(values) < 2:
+        return mean, 0.0, None
+    var = statistics.variance(values)
+    df = len(values) - 1
+    half = (_T95[df - 1] if df <= len(_T95) else 1.96) * math.sqrt(var / len(values))
+    return mean, var, [mean - half, mean + half]
+
+class TrialRunner:
+    """
+    Runs each test up to `max_trials` times, grading every trial as it
+    finishes, and stops a test early once at least `min_trials` have run and
+    its score CI is no wider than `ci_width`. All trials share one pool of
+    `concurrency` sandbox slots and one AsyncGrader.
+    """
+
+    def __init__(self, archive_path: str, cmd: str = "python agent_main.py", max_trials: int = MAX_TRIALS, min_trials: int = MIN_TRIALS,
+                 ci_width: float = TRIAL_CI_WIDTH, concurrency: int = 1, grader: AsyncGrader = None, mode: str = GRADING_MODE,
+                 batch_size: int = GRADER_BATCH_SIZE, rules: str = RULE_GRADING):
+        self.archive_path = archive_path
+        self.cmd = cmd
+        self.max_trials = max(1, max_trials)
+        self.min_trials = max(1, min(min_trials, self.max_trials))
+        self.ci_width = ci_width
+        self.concurrency = max(1, concurrency)
+        self.grader = grader or AsyncGrader()
+        self.mode = mode
+        self.batch_size = batch_size
+        self.rules = rules
+
+    async def _trial(self, pool, tc, n: int):
+        raw = await asyncio.get_running_loop().run_in_executor(pool, run_test_case, tc, self.archive_path, self.cmd)
+        raw["trial"] = n
+        (per_rubric,) = await grade_testcases_async([raw], self.grader, self.mode, self.batch_size, self.rules)
+        return raw, per_rubric
+
+    async def _test(self, pool, tc):
+        trials = []
+        while len(trials) < self.max_trials:
+            # Start with min_trials in parallel, then add one at a time until the CI is tight enough
+            n = max(1, self.min_trials - len(trials))
+            trials += await asyncio.gather(*(self._trial(pool, tc, len(trials) + i) for i in range(n)))
+            _, _, ci = mean_ci([test_score(pr) for _, pr in trials])
+            if len(trials) >= self.min_trials and ci is not None and ci[1] - ci[0] <= self.ci_width:
+                break
+        return tc, trials
+
+    async def run_async(self, suite):
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="nle_trials") as pool:
+            return await asyncio.gather(*(self._test(pool, tc) for tc in suite.tests))
+
+def _summarise_test(tc, trials, max_trials: int):
+    scores = [test_score(pr) for _, pr in trials]
+    mean, var, ci = mean_ci(scores)
+    per_rubric = {}
+    for r in WEIGHTS:
+        vals = [pr[r]["score"] for _, pr in trials if r in pr]
+        r_mean, r_var, r_ci = mean_ci(vals)
+        per_rubric[r] = {
+            "score": round(r_mean, 2),
+            "variance": round(r_var, 3),
+            "ci": [round(v, 2) for v in r_ci] if r_ci else None,
+            "notes": f"mean of {len(vals)} trial(s); last: {trials[-1][1][r].get('notes', '')}",
+            "mode": trials[-1][1][r].get("mode", "per_rubric"),
+        }
+    return {
+        "test_id": tc.id,
+        "job_id": trials[0][0].get("job_id"),
+        "job_ids": [raw.get("job_id") for raw, _ in trials],
+        "trials": len(trials),
+        "stopped_early": len(trials) < max_trials,
+        "score_mean": round(mean, 2),
+        "score_variance": round(var, 3),
+        "score_ci": [round(v, 2) for v in ci] if ci else None,
+        "trial_scores": [round(s, 2) for s in scores],
+        "per_rubric": per_rubric,
+    }
+
+def run_trials(suite_path: str, archive_path: str, cmd: str = "python agent_main.py", **kwargs):
+    """
+    Trials mode: runs and grades every test of a suite repeatedly (see
+    TrialRunner) and writes <run_id>_raw_results.json with every trial plus
+    <run_id>_report.json/.html whose per-rubric scores are trial means.
+    """
+    suite = load_suite(suite_path)
+    runner = TrialRunner(archive_path, cmd, **kwargs)
+    run_id = str(uuid.uuid4())
+    t0 = time.time()
+    results = asyncio.run(runner.run_async(suite))
+
+    raw_tests = [raw for _, trials in results for raw, _ in trials]
+    raw_path = storage.dump_json({"run_id": run_id, "suite": suite.suite, "tests": [storage.ref_trace(t) for t in raw_tests]},
+                                 REPORTS_DIR / f"{run_id}_raw_results.json")
+
+    tests = [_summarise_test(tc, trials, runner.max_trials) for tc, trials in results]
+    rubric_avg = {r: round(statistics.fmean(t["per_rubric"][r]["score"] for t in tests), 2) if tests else 0 for r in WEIGHTS}
+    total = round(sum(avg / 10.0 * WEIGHTS[r] for r, avg in rubric_avg.items()) * 100, 2)
+    runs = len(raw_tests)
+    resources = {m: [(raw.get("trace") or {}).get("resources", {}).get(m) for raw in raw_tests]
+                 for m in ("wall_seconds", "cpu_seconds", "peak_rss_bytes")}
+    report = {
+        "run_id": run_id,
+        "suite": suite.suite,
+        "agent_archive": archive_path,
+        "total_score": total,
+        "total_score_ci": bootstrap_ci([t["score_mean"] for t in tests]),
+        "rubric_avg": rubric_avg,
+        "generated_at": time.time(),
+        "weights": WEIGHTS,
+        "grading_mode": runner.mode,
+        "rule_grading": runner.rules,
+        "trials": {
+            "max_trials": runner.max_trials,
+            "min_trials": runner.min_trials,
+            "ci_width": runner.ci_width,
+            "sandbox_runs": runs,
+            "runs_saved": runner.max_trials * len(tests) - runs,
+            "tests_stopped_early": sum(t["stopped_early"] for t in tests),
+            "wall_seconds": round(time.time() - t0, 3),
+        },
+        "resource_usage": _usage_summary({m: [v for v in vals if v is not None] for m, vals in resources.items()}),
+        "raw_results_path": str(raw_path),
+        "grader_stats": {**runner.grader.stats, "cache": dict(get_cache().stats)},
+        "tests": tests,
+    }
+    out_json = Path(storage.dump_json(report, REPORTS_DIR / f"{run_id}_report.json"))
+    record_report(report, out_json)
+    out_html = REPORTS_DIR / f"{run_id}_report.html"
+    out_html.write_text(_html_summary(report) + "".join(_html_test(t) for t in tests) + _HTML_FOOT)
+    return out_json, out_html
+
+def main():
+    p = argparse.ArgumentParser(description="Run each test several times and report score means, variance and CIs")
+    p.add_argument("--suite", required=True)
+    p.add_argument("--archive", required=True)
+    p.add_argument("--cmd", default="python agent_main.py")
+    p.add_argument("--trials", type=int, default=MAX_TRIALS, help="max trials per test")
+    p.add_argument("--min-trials", type=int, default=MIN_TRIALS)
+    p.add_argument("--ci-width", type=float, default=TRIAL_CI_WIDTH, help="stop a test once its 95%% CI is this narrow (score points)")
+    p.add_argument("--concurrency", type=int, default=1)
+    p.add_argument("--grading-mode", choices=GRADING_MODES, default=GRADING_MODE)
+    p.add_argument("--rules", choices=RULE_MODES, default=RULE_GRADING)
+    args = p.parse_args()
+    out_json, out_html = run_trials(args.suite, args.archive, args.cmd, max_trials=args.trials, min_trials=args.min_trials,
+                                    ci_width=args.ci_width, concurrency=args.concurrency, mode=args.grading_mode, rules=args.rules)
+    print(f"Trials report:\nJSON: {out_json}\nHTML: {out_html}")
+
+if __name__ == "__main__":
+    main()
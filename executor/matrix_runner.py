@@ -0,0 +1,83 @@
+import os
+import glob
+import json
+import time
+import uuid
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from executor.test_executor import REPORTS_DIR, run_test_case
+from runner import storage
+from runner.run_agent_in_sandbox import sha256_file
+from tests.loader import load_suite
+
+def expand_suites(patterns):
+    """Expands glob patterns (e.g. tests/examples/*.yaml) keeping the given order, without repeats."""
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]
+        paths.extend(p for p in matches if p not in paths)
+    return paths
+
+def _work_key(archive_sha: str, tc, cmd: str) -> str:
+    # Same agent bytes + same prompt + same command is the same sandbox run,
+    # whichever suite or archive path it came from
+    return hashlib.sha256("|".join([archive_sha, cmd, tc.prompt]).encode("utf-8")).hexdigest()
+
+def run_matrix(archives, suites, cmd: str = "python agent_main.py", concurrency: int = 1):
+    """
+    Runs every suite against every archive through one shared pool of
+    `concurrency` sandbox jobs. Identical (archive hash, test) work runs once
+    and its result is copied into each cell that needs it. Writes one raw
+    results file per (archive, suite) cell plus a <matrix_id>_matrix.json
+    manifest, and returns the manifest path.
+    """
+    matrix_id = str(uuid.uuid4())
+    suite_paths = expand_suites(suites)
+    loaded = [(path, load_suite(path)) for path in suite_paths]
+    agents = [{"archive_path": a, "sha256": sha256_file(a)} for a in archives]
+
+    cells, unique = [], {}
+    for ai, agent in enumerate(agents):
+        for si, (path, suite) in enumerate(loaded):
+            keys = []
+            for tc in suite.tests:
+                key = _work_key(agent["sha256"], tc, cmd)
+                unique.setdefault(key, (tc, agent["archive_path"]))
+                keys.append(key)
+            cells.append((f"{matrix_id}_a{ai}_s{si}", agent, path, suite, keys))
+
+    t0 = time.time()
+    workers = max(1, min(int(concurrency or 1), len(unique) or 1))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nle_matrix") as pool:
+        futures = {key: pool.submit(run_test_case, tc, archive, cmd) for key, (tc, archive) in unique.items()}
+        done = {key: f.result() for key, f in futures.items()}
+
+    manifest_cells = []
+    for run_id, agent, path, suite, keys in cells:
+        tests = []
+        archive = os.path.abspath(agent["archive_path"])
+        for tc, key in zip(suite.tests, keys):
+            # Shared runs keep their sandbox job, but report this suite's test id and this cell's archive
+            test = storage.ref_trace(done[key])
+            if "trace" in test:
+                test = {**test, "trace": {**test["trace"], "archive_path": archive}}
+            tests.append({**test, "test_id": tc.id, "prompt": tc.prompt, "grader": tc.grader,
+                          "expected_keywords": tc.expected_keywords, "expected_tool": tc.expected_tool,
+                          "must_refuse": tc.must_refuse, "archive_path": archive})
+        out = storage.dump_json({"run_id": run_id, "suite": suite.suite, "tests": tests}, REPORTS_DIR / f"{run_id}_raw_results.json")
+        manifest_cells.append({"archive_path": agent["archive_path"], "archive_sha256": agent["sha256"],
+                               "suite": suite.suite, "suite_path": path, "run_id": run_id, "raw_results_path": str(out)})
+
+    manifest = {
+        "matrix_id": matrix_id,
+        "cmd": cmd,
+        "archives": agents,
+        "suites": suite_paths,
+        "cells": manifest_cells,
+        "jobs_requested": sum(len(keys) for *_, keys in cells),
+        "jobs_executed": len(unique),
+        "wall_seconds": round(time.time() - t0, 3),
+    }
+    out = REPORTS_DIR / f"{matrix_id}_matrix.json"
+    out.write_text(json.dumps(manifest, indent=2))
+    return out
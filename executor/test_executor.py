@@ -1,36 +1,102 @@
-import uuid, json, time
+import os, uuid, json, time, itertools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from api.tasks.sandbox_job import start_sandbox_job
+from api.tasks.progress import publish
+from runner import storage
 from tests.loader import load_suite
 
 DATA_DIR = Path("/data")
 REPORTS_DIR = DATA_DIR / "reports"
 REPORTS_DIR.mkdir(parents=True, exist_ok=True)
+# "json" (one document) or "jsonl" (header line + one test per line, written as tests finish)
+RAW_FORMAT = os.environ.get("NLE_RAW_FORMAT", "json")
+RAW_JSONL_FORMAT = "nle-raw-results-jsonl/1"
+# 1 = serve every test of a run from long-lived agent processes (line-delimited JSON
+# over stdin/stdout) instead of one process per test
+PERSISTENT_AGENT = os.environ.get("NLE_PERSISTENT_AGENT", "0") == "1"
 
-def run_suite_from_file(suite_path: str, archive_path: str, cmd: str="python agent_main.py"):
+def run_test_case(tc, archive_path: str, cmd: str="python agent_main.py", agents=None):
+    """Runs one test, its prompt on the agent's stdin, or as one request to `agents` (a PersistentAgentPool)."""
+    t0 = time.time()
+    try:
+        res = agents.run(tc.prompt) if agents else start_sandbox_job(archive_path, cmd, prompt=tc.prompt)
+    except Exception as e:
+        # A broken worker should only fail its own test, never the whole run
+        res = {"error": f"Sandbox job failed: {e}"}
+    job_id = res.get("job_id")
+    trace_path = res.get("trace_path")
+    trace = {}
+    try:
+        trace = storage.load_json(trace_path)
+    except Exception:
+        pass
+    duration = time.time() - t0
+    out = {
+        "test_id": tc.id,
+        "prompt": tc.prompt,
+        "grader": tc.grader,
+        "expected_keywords": tc.expected_keywords,
+        "expected_tool": tc.expected_tool,
+        "must_refuse": tc.must_refuse,
+        "job_id": job_id,
+        "trace_path": trace_path,
+        "trace": trace,
+        "duration": duration
+    }
+    if res.get("error"):
+        out["error"] = res["error"]
+    return out
+
+def run_tracked(tc, index: int, total: int, archive_path: str, cmd: str="python agent_main.py", agents=None, channel: str=None, completed=None):
+    """run_test_case plus test_running / test_finished progress events; `completed` is an itertools.count shared by the run."""
+    publish(channel, "test_running", test_id=tc.id, index=index)
+    res = run_test_case(tc, archive_path, cmd, agents)
+    publish(channel, "test_finished", test_id=tc.id, index=index, job_id=res.get("job_id"), exit_code=(res.get("trace") or {}).get("exit_code"),
+            duration=round(res["duration"], 3), error=res.get("error"), completed=next(completed) if completed else None, total=total)
+    return res
+
+def run_suite_from_file(suite_path: str, archive_path: str, cmd: str="python agent_main.py", concurrency: int=1, raw_format: str=None,
+                        persistent: bool=None, progress: str=None):
+    """
+    Runs every test of a suite and writes its raw results. Per-test progress
+    (queued, running, finished) is published on the `progress` channel
+    (default: the run id).
+    """
     suite = load_suite(suite_path)
     run_id = str(uuid.uuid4())
-    results = {"run_id": run_id, "suite": suite.suite, "tests": []}
-    for tc in suite.tests:
-        t0 = time.time()
-        res = start_sandbox_job(archive_path, cmd)
-        job_id = res.get("job_id")
-        trace_path = res.get("trace_path")
-        trace = {}
-        try:
-            trace = json.loads(open(trace_path).read())
-        except Exception:
-            pass
-        duration = time.time() - t0
-        results["tests"].append({
-            "test_id": tc.id,
-            "prompt": tc.prompt,
-            "grader": tc.grader,
-            "job_id": job_id,
-            "trace_path": trace_path,
-            "trace": trace,
-            "duration": duration
-        })
-    out = REPORTS_DIR / f"{run_id}_raw_results.json"
-    out.write_text(json.dumps(results, indent=2))
-    return out
\ No newline at end of file
+    channel = progress or run_id
+    total = len(suite.tests)
+    raw_format = raw_format or RAW_FORMAT
+    workers = max(1, min(int(concurrency or 1), len(suite.tests) or 1))
+    agents = None
+    if PERSISTENT_AGENT if persistent is None else persistent:
+        from runner.persistent_agent import PersistentAgentPool
+        # One long-lived agent per worker; each test is still its own job and trace
+        agents = PersistentAgentPool(archive_path, cmd, size=workers)
+
+    publish(channel, "run_start", run_id=run_id, suite=suite.suite, total=total)
+    for i, tc in enumerate(suite.tests):
+        publish(channel, "test_queued", test_id=tc.id, index=i)
+    completed = itertools.count(1)
+    run = lambda i, tc: run_tracked(tc, i, total, archive_path, cmd, agents, channel, completed)
+
+    try:
+        # map() yields in submission order, so raw results keep the suite order
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="nle_suite") as pool:
+            results = pool.map(run, range(total), suite.tests)
+            if raw_format == "jsonl":
+                with storage.open_write(REPORTS_DIR / f"{run_id}_raw_results.jsonl") as f:
+                    f.write(json.dumps({"format": RAW_JSONL_FORMAT, "run_id": run_id, "suite": suite.suite}) + "\n")
+                    for res in results:
+                        # Compact mode stores a trace reference instead of a second copy of the trace
+                        f.write(json.dumps(storage.ref_trace(res)) + "\n")
+                out = Path(f.final)
+            else:
+                results = {"run_id": run_id, "suite": suite.suite, "tests": [storage.ref_trace(r) for r in results]}
+                out = Path(storage.dump_json(results, REPORTS_DIR / f"{run_id}_raw_results.json"))
+    finally:
+        if agents:
+            agents.close()
+    publish(channel, "run_end", run_id=run_id, raw_results_path=str(out), total=total)
+    return out
@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+CACHE_DIR = Path("data/grader_cache")
+CACHE_DB = Path(os.environ.get("NLE_GRADER_CACHE_DB", "data/grader_cache.sqlite3"))
+# "sqlite" (default) or "json" (legacy one-file-per-entry directory)
+CACHE_BACKEND = os.environ.get("NLE_GRADER_CACHE_BACKEND", "sqlite")
+CACHE_TTL = float(os.environ.get("NLE_GRADER_CACHE_TTL", "0"))  # seconds, 0 = keep forever
+CACHE_MAX_ENTRIES = int(os.environ.get("NLE_GRADER_CACHE_MAX_ENTRIES", "200000"))
+# Eviction runs on open and then every N writes
+EVICT_EVERY = 1000
+
+class GraderCache(ABC):
+    """Interface shared by the grader cache backends."""
+
+    def __init__(self):
+        self.stats = {"hits": 0, "misses": 0, "writes": 0, "evicted": 0}
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    @abstractmethod
+    def get_many(self, keys):
+        ...
+
+    def set(self, key: str, value: dict):
+        self.set_many({key: value})
+
+    @abstractmethod
+    def set_many(self, entries: dict):
+        ...
+
+    def evict(self):
+        return 0
+
+    def _count(self, requested: int, found: int):
+        self.stats["hits"] += found
+        self.stats["misses"] += requested - found
+
+class JsonDirCache(GraderCache):
+    """Legacy layout: data/grader_cache/<sha256>.json, now written atomically."""
+
+    def __init__(self, cache_dir: Path = CACHE_DIR):
+        super().__init__()
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_many(self, keys):
+        out = {}
+        for key in dict.fromkeys(keys):
+            try:
+                out[key] = json.loads((self.cache_dir / f"{key}.json").read_text())
+            except (OSError, json.JSONDecodeError):
+                pass
+        self._count(len(set(keys)), len(out))
+        return out
+
+    def set_many(self, entries: dict):
+        for key, value in entries.items():
+            path = self.cache_dir / f"{key}.json"
+            tmp = path.with_name(f".{key}.{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_text(json.dumps(value))
+            os.replace(tmp, path)
+            self.stats["writes"] += 1
+
+class SQLiteGraderCache(GraderCache):
+    """
+    Single-file SQLite store (WAL mode) with bulk lookups, atomic upserts,
+    TTL expiry and LRU eviction down to `max_entries`.
+    """
+
+    def __init__(self, db_path: Path = CACHE_DB, ttl: float = CACHE_TTL, max_entries: int = CACHE_MAX_ENTRIES):
+        super().__init__()
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._writes_since_evict = 0
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS grader_cache ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS grader_cache_lru ON grader_cache(last_access)")
+        self.evict()
+
+    def get_many(self, keys):
+        keys = list(dict.fromkeys(keys))
+        out = {}
+        now = time.time()
+        with self._lock:
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                marks = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value, created_at FROM grader_cache WHERE key IN ({marks})", chunk
+                ).fetchall()
+                hit_keys = []
+                for key, value, created_at in rows:
+                    if self.ttl and now - created_at > self.ttl:
+                        continue
+                    out[key] = json.loads(value)
+                    hit_keys.append(key)
+                if hit_keys:
+                    self._conn.execute(
+                        f"UPDATE grader_cache SET last_access = ? WHERE key IN ({','.join('?' * len(hit_keys))})",
+                        [now, *hit_keys],
+                    )
+        self._count(len(keys), len(out))
+        return out
+
+    def set_many(self, entries: dict):
+        if not entries:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(value), now, now) for key, value in entries.items()]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany("INSERT OR REPLACE INTO grader_cache VALUES (?, ?, ?, ?)", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self.stats["writes"] += len(rows)
+            self._writes_since_evict += len(rows)
+            due = self._writes_since_evict >= EVICT_EVERY
+        if due:
+            self.evict()
+
+    def evict(self):
+        removed = 0
+        with self._lock:
+            self._writes_since_evict = 0
+            if self.ttl:
+                removed += self._conn.execute(
+                    "DELETE FROM grader_cache WHERE created_at < ?", (time.time() - self.ttl,)
+                ).rowcount
+            if self.max_entries:
+                removed += self._conn.execute(
+                    "DELETE FROM grader_cache WHERE key IN ("
+                    " SELECT key FROM grader_cache ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                    (self.max_entries,),
+                ).rowcount
+        self.stats["evicted"] += removed
+        return removed
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM grader_cache").fetchone()[0]
+
+def migrate_json_dir(src_dir: Path, dest: GraderCache, batch: int = 1000):
+    """Copies every <key>.json entry from a legacy cache directory into `dest`."""
+    moved, skipped, pending = 0, 0, {}
+    for path in Path(src_dir).glob("*.json"):
+        try:
+            pending[path.stem] = json.loads(path.read_text())
+        except (OSError, json.JSONDecodeError):
+            skipped += 1
+            continue
+        if len(pending) >= batch:
+            dest.set_many(pending)
+            moved += len(pending)
+            pending = {}
+    dest.set_many(pending)
+    moved += len(pending)
+    return {"migrated": moved, "skipped": skipped}
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_cache() -> GraderCache:
+    """Process-wide cache instance for the configured backend."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = JsonDirCache() if CACHE_BACKEND == "json" else SQLiteGraderCache()
+        return _cache
+
+def main():
+    p = argparse.ArgumentParser(description="Grader cache maintenance")
+    sub = p.add_subparsers(dest="action", required=True)
+    m = sub.add_parser("migrate", help="import legacy data/grader_cache/*.json entries into SQLite")
+    m.add_argument("--src", default=str(CACHE_DIR))
+    m.add_argument("--db", default=str(CACHE_DB))
+    e = sub.add_parser("evict", help="apply TTL / size eviction now")
+    e.add_argument("--db", default=str(CACHE_DB))
+    args = p.parse_args()
+
+    cache = SQLiteGraderCache(Path(args.db))
+    if args.action == "migrate":
+        print(json.dumps(migrate_json_dir(Path(args.src), cache)))
+    elif args.action == "evict":
+        print(json.dumps({"evicted": cache.evict(), "entries": len(cache)}))
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,13 @@
 import os
+import re
 import json
+import time
+import random
+import asyncio
 import hashlib
+import threading
 from pathlib import Path
+from graders.grader_cache import get_cache
 
 # Google Gen AI Import
 try:
@@ -11,13 +17,56 @@ except ImportError:
     genai = None
 
 PROMPT_DIR = Path(__file__).parent / "prompts"
-CACHE_DIR = Path("data/grader_cache")
-CACHE_DIR.mkdir(parents=True, exist_ok=True)
 
 # Configuration
 GOOGLE_API_KEY = os.environ.get("GOOGLE_API_KEY")
 # Using Flash for speed/cost (Free tier compatible)
-GEMINI_MODEL = "gemini-2.0-flash" 
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.0-flash")
+# Bump when the cache key layout changes
+CACHE_KEY_VERSION = "v2"
+# Async engine limits: in-flight requests, request rate (per second) and 429 retries
+GRADER_CONCURRENCY = int(os.environ.get("NLE_GRADER_CONCURRENCY", "8"))
+GRADER_RPS = float(os.environ.get("NLE_GRADER_RPS", "10"))
+GRADER_MAX_RETRIES = int(os.environ.get("NLE_GRADER_MAX_RETRIES", "5"))
+# "per_rubric" (one call per rubric), "combined" (one call scoring every rubric)
+# or "batched" (one call scoring up to GRADER_BATCH_SIZE tests on one rubric)
+GRADING_MODE = os.environ.get("NLE_GRADING_MODE", "per_rubric")
+GRADING_MODES = ("per_rubric", "combined", "batched")
+GRADER_BATCH_SIZE = int(os.environ.get("NLE_GRADER_BATCH_SIZE", "8"))
+_PLACEHOLDER_RE = re.compile(r"\{\{(\w+)\}\}")
+
+_client = None
+_client_lock = threading.Lock()
+
+class PromptTemplate:
+    """
+    A rubric template compiled once: the text is split around its {{field}}
+    placeholders so rendering is a single join, and `sha256` identifies the
+    exact wording for cache keys.
+    """
+    def __init__(self, name: str, text: str):
+        self.name = name
+        self.text = text
+        self.sha256 = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        # re.split with one group alternates literal, field, literal, ...
+        self._parts = _PLACEHOLDER_RE.split(text)
+        self.fields = list(dict.fromkeys(self._parts[1::2]))
+        # Same text with every placeholder shown as a <field> reference (batch mode)
+        self.as_reference = _PLACEHOLDER_RE.sub(lambda m: f"<{m.group(1)}>", text)
+
+    def render(self, values: dict) -> str:
+        out = []
+        for i, part in enumerate(self._parts):
+            if i % 2 == 0:
+                out.append(part)
+            elif part in values:
+                out.append(str(values[part]))
+            else:
+                out.append("{{" + part + "}}")
+        return "".join(out)
+
+_templates = {}
+_templates_lock = threading.Lock()
 
 def _load_prompt_template(rubric_name: str):
     p = PROMPT_DIR / f"{rubric_name}.txt"
@@ -25,59 +74,398 @@ def _load_prompt_template(rubric_name: str):
         raise FileNotFoundError(f"Prompt template not found: {p}")
     return p.read_text()
 
+def get_template(rubric_name: str) -> PromptTemplate:
+    """Loads and compiles a template on first use; later calls never touch the disk."""
+    template = _templates.get(rubric_name)
+    if template is None:
+        with _templates_lock:
+            template = _templates.get(rubric_name)
+            if template is None:
+                template = PromptTemplate(rubric_name, _load_prompt_template(rubric_name))
+                _templates[rubric_name] = template
+    return template
+
+def reload_templates():
+    """Drops compiled templates so edited prompt files are picked up."""
+    with _templates_lock:
+        _templates.clear()
+
+def template_hash(rubric_name: str) -> str:
+    return get_template(rubric_name).sha256
+
 def _make_cache_key(rubric_name: str, prompt: str, response: str, expected: str):
-    key = "|".join([rubric_name, prompt or "", str(response) or "", str(expected) or ""])
+    # Template hash and model id are part of the key: editing a prompt file or
+    # switching GEMINI_MODEL must not serve scores produced by the old setup
+    key = "|".join([CACHE_KEY_VERSION, GEMINI_MODEL, template_hash(rubric_name), rubric_name,
+                    prompt or "", str(response) or "", str(expected) or ""])
     return hashlib.sha256(key.encode("utf-8")).hexdigest()
 
-def _call_gemini(prompt_text: str):
-    """Calls Gemini with Native JSON enforcement."""
+def _batched_cache_key(rubric_name: str, prompt: str, response: str, expected: str):
+    # Batched scores get their own key (batch template included) so a per_rubric
+    # run never serves them, which would make the two modes incomparable
+    return _make_cache_key("batch", prompt, response, json.dumps([rubric_name, template_hash(rubric_name), expected]))
+
+def _fill_prompt(rubric_name: str, prompt: str, response: str, expected: str):
+    return get_template(rubric_name).render({
+        "prompt": prompt,
+        "response": response,
+        "expected": expected,
+        "expected_tool": expected,
+    })
+
+def _fill_combined_prompt(inputs):
+    """
+    Fills the combined template from per-rubric (rubric, prompt, response, expected)
+    inputs; the tool_usage entry carries the tool calls and expected tool.
+    """
+    by_rubric = {i[0]: i for i in inputs}
+    prompt = inputs[0][1]
+    text_in = by_rubric.get("correctness") or next((i for i in inputs if i[0] != "tool_usage"), (None, prompt, "", ""))
+    tool_in = by_rubric.get("tool_usage", (None, prompt, "[]", ""))
+    return get_template("combined").render({
+        "prompt": prompt,
+        "response": text_in[2],
+        "tool_calls": tool_in[2],
+        "expected": text_in[3],
+        "expected_tool": tool_in[3],
+    })
+
+def _fill_batch_prompt(rubric_name: str, items):
+    """
+    Packs several (rubric, prompt, response, expected) items into one prompt.
+    The rubric template is kept as instructions with its placeholders turned
+    into <field> references, and each item lists its own field values.
+    """
+    template = get_template(rubric_name)
+    blocks = []
+    for n, (_, prompt, response, expected) in enumerate(items, start=1):
+        values = {"prompt": prompt, "response": response, "expected": expected, "expected_tool": expected}
+        lines = [f"ITEM {n}:"] + [f"<{f}>: {values.get(f, '')}" for f in template.fields]
+        blocks.append("\n".join(lines))
+    return get_template("batch").render({
+        "count": len(items),
+        "rubric": template.as_reference,
+        "items": "\n\n".join(blocks),
+    })
+
+def _valid_score_entry(entry):
+    if not isinstance(entry, dict):
+        return None
+    score = entry.get("score")
+    if isinstance(score, bool) or not isinstance(score, (int, float)) or int(score) != score:
+        return None
+    if not 1 <= score <= 10:
+        return None
+    notes = entry.get("notes", "")
+    if not isinstance(notes, str):
+        return None
+    return {"score": int(score), "notes": notes}
+
+def parse_batch_result(obj, count: int):
+    """
+    Maps a batched model output back onto `count` items. Entries are matched
+    by their 1-based "id" when present, otherwise by position. Missing or
+    invalid entries come back as None so the caller can re-grade them alone.
+    """
+    if isinstance(obj, dict):
+        obj = obj.get("items") or obj.get("results")
+    out = [None] * count
+    if not isinstance(obj, list):
+        return out
+    for pos, entry in enumerate(obj):
+        ident = entry.get("id") if isinstance(entry, dict) else None
+        idx = ident - 1 if isinstance(ident, int) and not isinstance(ident, bool) else pos
+        if 0 <= idx < count and out[idx] is None:
+            out[idx] = _valid_score_entry(entry)
+    return out
+
+def validate_combined_result(obj, rubrics):
+    """
+    Checks a combined-mode model output: one {"score": 1..10, "notes": str}
+    object per rubric. Returns the normalized dict, or None if invalid.
+    """
+    if not isinstance(obj, dict):
+        return None
+    out = {}
+    for rubric in rubrics:
+        entry = _valid_score_entry(obj.get(rubric))
+        if entry is None:
+            return None
+        out[rubric] = entry
+    return out
+
+def _get_client():
+    """One genai.Client per process; it pools connections across calls."""
+    global _client
     if not genai:
         raise ImportError("Please install google-genai: pip install google-genai")
     if not GOOGLE_API_KEY:
         raise ValueError("GOOGLE_API_KEY environment variable is missing")
+    with _client_lock:
+        if _client is None:
+            _client = genai.Client(api_key=GOOGLE_API_KEY)
+        return _client
 
-    client = genai.Client(api_key=GOOGLE_API_KEY)
+def _generation_config():
+    return types.GenerateContentConfig(
+        response_mime_type="application/json", # <--- ADK Best Practice
+        temperature=0.1
+    )
 
-    response = client.models.generate_content(
+def _parse_model_output(text: str):
+    try:
+        return json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        return {"score": 1, "notes": "JSON Parsing failed from model output", "error": "parse_failed"}
+
+def _call_gemini(prompt_text: str):
+    """Calls Gemini with Native JSON enforcement."""
+    response = _get_client().models.generate_content(
         model=GEMINI_MODEL,
         contents=prompt_text,
-        config=types.GenerateContentConfig(
-            response_mime_type="application/json", # <--- ADK Best Practice
-            temperature=0.1
-        )
+        config=_generation_config()
     )
     
     # Parse the JSON response directly
-    try:
-        return json.loads(response.text)
-    except json.JSONDecodeError:
-        return {"score": 1, "notes": "JSON Parsing failed from model output"}
+    return _parse_model_output(response.text)
+
+async def _call_gemini_async(prompt_text: str):
+    response = await _get_client().aio.models.generate_content(
+        model=GEMINI_MODEL,
+        contents=prompt_text,
+        config=_generation_config()
+    )
+    return _parse_model_output(response.text)
+
+def _read_cache(key: str):
+    return get_cache().get(key)
+
+def _write_cache(key: str, result: dict):
+    get_cache().set(key, result)
+
+def _cacheable(result) -> bool:
+    # API errors and unparseable output are graded again on the next run, never served from the cache
+    return isinstance(result, dict) and not result.get("error")
 
 def grade(rubric_name: str, prompt: str, response: str, expected: str = ""):
     """
     Evaluates the input using Gemini.
     """
     key = _make_cache_key(rubric_name, prompt, response, expected)
-    cache_path = CACHE_DIR / f"{key}.json"
 
     # Check Cache
-    if cache_path.exists():
-        return json.loads(cache_path.read_text())
+    cached = _read_cache(key)
+    if cached is not None:
+        return cached
 
     # Prepare Prompt
-    template = _load_prompt_template(rubric_name)
-    filled_prompt = template.replace("{{prompt}}", str(prompt)) \
-                            .replace("{{response}}", str(response)) \
-                            .replace("{{expected}}", str(expected)) \
-                            .replace("{{expected_tool}}", str(expected))
+    filled_prompt = _fill_prompt(rubric_name, prompt, response, expected)
 
     # Call Google AI
     try:
         result = _call_gemini(filled_prompt)
     except Exception as e:
         print(f"Error calling Gemini: {e}")
-        result = {"score": 0, "notes": f"API Error: {str(e)}"}
+        result = {"score": 0, "notes": f"API Error: {str(e)}", "error": "api_error"}
 
     # Save to Cache
-    cache_path.write_text(json.dumps(result))
-    return result
\ No newline at end of file
+    if _cacheable(result):
+        _write_cache(key, result)
+    return result
+
+def _is_rate_limited(exc: Exception) -> bool:
+    code = getattr(exc, "code", None) or getattr(exc, "status_code", None)
+    if code == 429:
+        return True
+    text = str(exc)
+    return "429" in text or "RESOURCE_EXHAUSTED" in text
+
+class TokenBucket:
+    """Async token bucket: `rate` requests per second with bursts up to `capacity`."""
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            async with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            await asyncio.sleep(wait)
+
+class AsyncGrader:
+    """
+    Concurrent grading engine. `call_model` is an async callable taking the
+    filled prompt and returning the parsed result dict; it defaults to Gemini
+    and can be swapped for a stub or a local fake server in tests.
+    """
+    def __init__(self, call_model=None, concurrency: int = GRADER_CONCURRENCY, rps: float = GRADER_RPS,
+                 max_retries: int = GRADER_MAX_RETRIES, base_backoff: float = 1.0, max_backoff: float = 30.0):
+        self.call_model = call_model or _call_gemini_async
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.concurrency = max(1, concurrency)
+        self.rps = rps
+        self._loop = None
+        self._prefetched = {}
+        self.stats = {"calls": 0, "cache_hits": 0, "retries": 0, "errors": 0}
+
+    def prefetch(self, items, key_fn=_make_cache_key):
+        """Loads cached results for many (rubric, prompt, response, expected) items in one bulk lookup."""
+        keys = [key_fn(*item) for item in items]
+        found = get_cache().get_many(keys)
+        # Misses are remembered too so they are not looked up a second time
+        self._prefetched.update({k: found.get(k) for k in keys})
+
+    def _lookup(self, key: str):
+        if key in self._prefetched:
+            return self._prefetched.pop(key)
+        return _read_cache(key)
+
+    def _limits(self):
+        # asyncio primitives belong to one event loop; rebuild them if the
+        # grader is reused across asyncio.run() calls
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.concurrency)
+            self._bucket = TokenBucket(self.rps)
+        return self._sem, self._bucket
+
+    async def _call_with_retry(self, prompt_text: str):
+        sem, bucket = self._limits()
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            try:
+                async with sem:
+                    self.stats["calls"] += 1
+                    return await self.call_model(prompt_text)
+            except Exception as e:
+                if not _is_rate_limited(e) or attempt >= self.max_retries:
+                    raise
+                delay = min(self.max_backoff, self.base_backoff * (2 ** attempt))
+                self.stats["retries"] += 1
+                attempt += 1
+                await asyncio.sleep(delay * random.uniform(0.5, 1.0))
+
+    async def grade(self, rubric_name: str, prompt: str, response: str, expected: str = ""):
+        key = _make_cache_key(rubric_name, prompt, response, expected)
+        cached = self._lookup(key)
+        if cached is not None:
+            self.stats["cache_hits"] += 1
+            return cached
+
+        filled_prompt = _fill_prompt(rubric_name, prompt, response, expected)
+        try:
+            result = await self._call_with_retry(filled_prompt)
+        except Exception as e:
+            print(f"Error calling Gemini: {e}")
+            result = {"score": 0, "notes": f"API Error: {str(e)}", "error": "api_error"}
+
+        if _cacheable(result):
+            _write_cache(key, result)
+        else:
+            self.stats["errors"] += 1
+        return result
+
+    async def grade_combined(self, inputs):
+        """
+        Scores every rubric of one test case with a single model call.
+        `inputs` are the per-rubric (rubric, prompt, response, expected) tuples;
+        if the combined output fails validation they are graded one by one.
+        Each result records the mode that produced it.
+        """
+        rubrics = [i[0] for i in inputs]
+        key = _make_cache_key("combined", inputs[0][1], json.dumps([i[2] for i in inputs]), json.dumps([i[3] for i in inputs]))
+        parsed = _read_cache(key)
+        if parsed is not None:
+            self.stats["cache_hits"] += 1
+        else:
+            try:
+                raw = await self._call_with_retry(_fill_combined_prompt(inputs))
+                parsed = validate_combined_result(raw, rubrics)
+            except Exception as e:
+                print(f"Error calling Gemini (combined): {e}")
+                parsed = None
+            if parsed is not None:
+                _write_cache(key, parsed)
+
+        if parsed is not None:
+            return {r: {**parsed[r], "mode": "combined"} for r in rubrics}
+
+        self.stats["combined_fallbacks"] = self.stats.get("combined_fallbacks", 0) + 1
+        results = await self.grade_many(inputs)
+        return {i[0]: {**res, "mode": "per_rubric", "fallback_from": "combined"} for i, res in zip(inputs, results)}
+
+    async def grade_batched(self, items, batch_size: int = GRADER_BATCH_SIZE):
+        """
+        Grades (rubric, prompt, response, expected) items by packing up to
+        `batch_size` uncached items of the same rubric into one call. Each
+        score is cached under its own per-item batched key; items missing
+        from a malformed or short reply are graded individually.
+        """
+        results = [None] * len(items)
+        pending = {}
+        self.prefetch(items, _batched_cache_key)
+        for idx, item in enumerate(items):
+            cached = self._lookup(_batched_cache_key(*item))
+            if cached is not None:
+                self.stats["cache_hits"] += 1
+                results[idx] = cached
+            else:
+                pending.setdefault(item[0], []).append(idx)
+
+        chunks = []
+        for rubric, idxs in pending.items():
+            for start in range(0, len(idxs), max(1, batch_size)):
+                chunks.append(idxs[start:start + max(1, batch_size)])
+        graded = await asyncio.gather(*(self._grade_chunk([items[i] for i in chunk]) for chunk in chunks))
+        for chunk, chunk_results in zip(chunks, graded):
+            for idx, res in zip(chunk, chunk_results):
+                results[idx] = res
+        return results
+
+    async def _grade_chunk(self, chunk):
+        if len(chunk) == 1:
+            return [await self.grade(*chunk[0])]
+        prompt_text = _fill_batch_prompt(chunk[0][0], chunk)
+        try:
+            parsed = parse_batch_result(await self._call_with_retry(prompt_text), len(chunk))
+        except Exception as e:
+            print(f"Error calling Gemini (batch): {e}")
+            parsed = [None] * len(chunk)
+
+        self.stats["batch_calls"] = self.stats.get("batch_calls", 0) + 1
+        self.stats["batch_items"] = self.stats.get("batch_items", 0) + len(chunk)
+        # Rough token estimate (~4 chars/token): per-item prompts avoided minus the batch prompt.
+        # Signed: short items can make the batch prompt longer than the prompts it replaces
+        single_chars = sum(len(_fill_prompt(*item)) for item, res in zip(chunk, parsed) if res is not None)
+        if single_chars:
+            delta = (single_chars - len(prompt_text)) // 4
+            self.stats["est_prompt_tokens_delta"] = self.stats.get("est_prompt_tokens_delta", 0) + delta
+
+        async def finish(item, res):
+            if res is None:
+                self.stats["batch_fallback_items"] = self.stats.get("batch_fallback_items", 0) + 1
+                return await self.grade(*item)
+            res = {**res, "mode": "batched"}
+            _write_cache(_batched_cache_key(*item), res)
+            return res
+        return list(await asyncio.gather(*(finish(item, res) for item, res in zip(chunk, parsed))))
+
+    async def grade_many(self, items):
+        """Grades (rubric, prompt, response, expected) tuples concurrently, preserving order."""
+        self.prefetch(items)
+        return await asyncio.gather(*(self.grade(*item) for item in items))
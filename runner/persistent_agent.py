@@ -0,0 +1,307 @@
+import os
+import json
+import time
+import uuid
+import queue
+import signal
+import threading
+import subprocess
+from pathlib import Path
+from runner.run_agent_in_sandbox import (DATA_DIR, DOCKER_BIN, SANDBOX_IMAGE, EXTRACT_CACHE, TRACE_EVENTS, RESOURCE_SAMPLE_SECONDS, MAX_TOOL_LINE_BYTES,
+                                         TraceEventLog, ResourceSampler, docker_available, extract_archive, get_extraction_cache,
+                                         host_mount_path, job_captures, write_trace, _sample_loop)
+
+# Set in the agent's environment so one command can serve both modes
+PROTOCOL_ENV = "NLE_AGENT_PROTOCOL"
+PROTOCOL = "jsonl"
+# Extra time the first request of a freshly started agent gets for interpreter/container startup
+STARTUP_TIMEOUT = float(os.getenv("NLE_PERSISTENT_STARTUP_TIMEOUT", "30"))
+
+class PersistentAgent:
+    """
+    One long-lived agent process (in its own container when Docker is
+    available) serving many prompts over line-delimited JSON: the runner
+    writes {"id", "prompt"} to its stdin and waits for a stdout line
+    {"id", "output", "tool_calls"} with the same id. Every other output line
+    in between belongs to that request. Each request still gets its own
+    job_id, trace, event log and timeout; a timed-out or crashed agent is
+    killed and restarted on the next request.
+    """
+
+    def __init__(self, archive: str, cmd: str = "python agent_main.py", timeout: int = 30, memory: str = "256m", cpus: str = "0.5",
+                 startup_timeout: float = STARTUP_TIMEOUT):
+        self.archive = archive
+        self.cmd = cmd
+        self.timeout = timeout
+        self.startup_timeout = startup_timeout
+        self.memory = memory
+        self.cpus = str(cpus)
+        self.agent_id = uuid.uuid4().hex[:12]
+        self.workdir = None
+        self.proc = None
+        self.container = None
+        self.argv = None
+        self.served = 0
+        self.restarts = -1
+        self._digest = None
+        self._lines = None
+        self._err = None
+        self._err_lock = threading.Lock()
+
+    def _extract(self):
+        if self.workdir:
+            return
+        if not Path(self.archive).exists():
+            raise FileNotFoundError(f"Archive not found: {self.archive}")
+        if EXTRACT_CACHE:
+            self._digest, self.workdir = get_extraction_cache().acquire(self.archive)
+        else:
+            self.workdir = os.path.join(DATA_DIR, "work", f"agent_{self.agent_id}")
+            Path(self.workdir).mkdir(parents=True, exist_ok=True)
+            extract_archive(self.archive, self.workdir)
+
+    def _start(self):
+        self._extract()
+        if docker_available():
+            self.container = f"nle_agent_{self.agent_id}_{self.restarts + 1}"
+            self.argv = [
+                DOCKER_BIN,"run","-i","--rm",
+                "--name",self.container,
+                "--cpus",self.cpus,
+                "--memory",self.memory,
+                "--network","none",
+                # Same environment as the local path: an agent that never flushes must still answer
+                "-e",f"{PROTOCOL_ENV}={PROTOCOL}",
+                "-e","PYTHONUNBUFFERED=1",
+                "-e","PYTHONDONTWRITEBYTECODE=1",
+                "-v",f"{host_mount_path(self.workdir)}:/agent:ro",
+                SANDBOX_IMAGE,
+                "bash","-lc",f"cd /agent && {self.cmd}"
+            ]
+            env = None
+        else:
+            self.container = None
+            self.argv = ["bash", "-lc", f"cd {self.workdir} && {self.cmd}"]
+            # workdir may be the shared extraction cache; keep the agent from writing bytecode into it
+            env = {**os.environ, "PYTHONDONTWRITEBYTECODE": "1", "PYTHONUNBUFFERED": "1", PROTOCOL_ENV: PROTOCOL}
+        self.proc = subprocess.Popen(self.argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                     env=env, start_new_session=True)
+        self.restarts += 1
+        # Bounded, so a flood of output backs up into the agent instead of our memory
+        self._lines = queue.Queue(maxsize=16)
+        threading.Thread(target=self._read_stdout, args=(self.proc, self._lines), daemon=True).start()
+        threading.Thread(target=self._read_stderr, args=(self.proc,), daemon=True).start()
+
+    @staticmethod
+    def _write_request(proc, data: bytes):
+        try:
+            proc.stdin.write(data)
+            proc.stdin.flush()
+        except (OSError, ValueError):
+            pass  # the agent exited or was killed; its EOF / the deadline is picked up by the reader
+
+    def _put(self, proc, lines, item) -> bool:
+        while True:
+            try:
+                lines.put(item, timeout=1)
+                return True
+            except queue.Full:
+                if self.proc is not proc:
+                    return False  # killed or replaced; nobody reads this queue any more
+
+    def _read_stdout(self, proc, lines):
+        # Whole lines up to MAX_TOOL_LINE_BYTES (the most any response needs); a longer
+        # line is passed on in pieces, which StreamCapture joins and bounds as usual
+        buf = b""
+        for chunk in iter(lambda: proc.stdout.read1(65536), b""):
+            buf += chunk
+            while True:
+                nl = buf.find(b"\n")
+                if nl < 0:
+                    break
+                if not self._put(proc, lines, buf[:nl + 1]):
+                    return
+                buf = buf[nl + 1:]
+            if len(buf) > MAX_TOOL_LINE_BYTES:
+                if not self._put(proc, lines, buf):
+                    return
+                buf = b""
+        if buf and not self._put(proc, lines, buf):
+            return
+        self._put(proc, lines, None)
+
+    def _read_stderr(self, proc):
+        for chunk in iter(lambda: proc.stderr.read1(65536), b""):
+            with self._err_lock:
+                if self._err is not None:
+                    self._err.feed(chunk)
+
+    def _kill(self):
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+        if self.container:
+            try:
+                subprocess.run([DOCKER_BIN,"rm","-f",self.container], capture_output=True, timeout=10)
+            except Exception:
+                pass
+        proc.wait()
+
+    def run(self, prompt: str, job_id: str = None):
+        """Sends one prompt and writes its trace; returns {"job_id", "trace_path"} like start_sandbox_job."""
+        job_id = job_id or str(uuid.uuid4())
+        events = TraceEventLog(job_id) if TRACE_EVENTS else None
+        if events:
+            events.emit("job_start", self.cmd, archive=os.path.abspath(self.archive), timeout_s=self.timeout,
+                        memory=self.memory, cpus=self.cpus, persistent=True, agent_id=self.agent_id)
+        try:
+            result = self._request(job_id, prompt, events)
+        except Exception as e:
+            self._kill()
+            result = {"exit_code": -2, "stdout": "", "stderr": f"Persistent agent failed: {e}", "duration_seconds": 0}
+        trace_path = write_trace(job_id, self.archive, self.cmd, result, self.workdir or "", events, prompt)
+        return {"job_id": job_id, "trace_path": trace_path}
+
+    def _request(self, job_id: str, prompt: str, events: TraceEventLog = None):
+        start = time.time()
+        started = self.proc is None or self.proc.poll() is not None
+        if started:
+            self._kill()
+            self._start()
+            if events:
+                events.emit("process_start", self.argv[-1], pid=self.proc.pid, timeout_s=self.timeout, restarts=self.restarts)
+        # Lines the agent printed after its previous response belong to no request
+        while not self._lines.empty():
+            if self._lines.get_nowait() is None:
+                self._lines.put(None)
+                break
+        out, err = job_captures(job_id, events)
+        with self._err_lock:
+            self._err = err
+        sampler = ResourceSampler(container=self.container, baseline=True) if self.container else ResourceSampler(pgid=self.proc.pid, baseline=True)
+        sampler.sample(fresh=True)
+        mono = time.monotonic()
+        stop_sampling = threading.Event()
+        if RESOURCE_SAMPLE_SECONDS > 0:
+            threading.Thread(target=_sample_loop, args=(sampler, out, err, events, mono, stop_sampling), daemon=True).start()
+
+        exit_code, response, note = 0, None, None
+        # Written from a thread: an agent that stops reading stdin would otherwise block
+        # us once the pipe fills; the deadline below then kills it like any other hang
+        request = (json.dumps({"id": job_id, "prompt": prompt}) + "\n").encode("utf-8")
+        threading.Thread(target=self._write_request, args=(self.proc, request), daemon=True).start()
+        deadline = mono + self.timeout + (self.startup_timeout if started else 0)
+        while response is None:
+            try:
+                line = self._lines.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                self._kill()
+                exit_code, note = -1, f"TIMEOUT after {self.timeout}s (persistent agent restarted)"
+                break
+            if line is None:
+                code = self.proc.wait()
+                self.proc = None
+                exit_code, note = code or -3, f"Agent process exited ({code}) before responding"
+                break
+            try:
+                msg = json.loads(line)
+            except ValueError:
+                msg = None
+            if isinstance(msg, dict) and msg.get("id") == job_id:
+                response = msg
+            else:
+                out.feed(line)
+
+        wall = time.monotonic() - mono
+        sampler.sample(fresh=True)
+        stop_sampling.set()
+        with self._err_lock:
+            self._err = None
+        if response is not None:
+            # Same stdout shape as a one-shot run, so graders see no difference
+            if response.get("tool_calls"):
+                out.feed((json.dumps({"tool_calls": response["tool_calls"]}) + "\n").encode("utf-8"))
+            if response.get("output"):
+                out.feed((str(response["output"]).rstrip("\n") + "\n").encode("utf-8"))
+            if response.get("error"):
+                exit_code, note = 1, str(response["error"])
+            self.served += 1
+        if note:
+            err.feed(("\n" + note).encode("utf-8"))
+        out.close()
+        err.close()
+        resources = sampler.finish(wall)
+        if events:
+            events.emit("process_exit" if response is None else "response", None, exit_code=exit_code, timed_out=exit_code == -1,
+                        stdout_bytes=out.total, stderr_bytes=err.total, **resources)
+        return {
+            "exit_code": exit_code,
+            "stdout": out.text(),
+            "stderr": err.text(),
+            "duration_seconds": round(time.time() - start, 3),
+            "streamed": True,
+            "tool_calls": out.tool_calls,
+            "stdout_bytes": out.total,
+            "stderr_bytes": err.total,
+            "stdout_truncated": out.truncated,
+            "stderr_truncated": err.truncated,
+            "stdout_log": out.spill_path,
+            "stderr_log": err.spill_path,
+            "resources": resources,
+            "docker_cmd": " ".join(self.argv) if self.container else None,
+            "container": "persistent",
+        }
+
+    def close(self):
+        if self.proc is not None:
+            try:
+                # EOF on stdin asks the agent to exit on its own
+                self.proc.stdin.close()
+                self.proc.wait(timeout=5)
+                self.proc = None
+            except (OSError, subprocess.TimeoutExpired):
+                pass
+        self._kill()
+        if self._digest:
+            get_extraction_cache().release(self._digest)
+            self._digest = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class PersistentAgentPool:
+    """`size` PersistentAgents of one archive, each serving one request at a time."""
+
+    def __init__(self, archive: str, cmd: str = "python agent_main.py", size: int = 1, **kwargs):
+        self.agents = [PersistentAgent(archive, cmd, **kwargs) for _ in range(max(1, size))]
+        self._idle = queue.Queue()
+        for agent in self.agents:
+            self._idle.put(agent)
+
+    def run(self, prompt: str, job_id: str = None):
+        agent = self._idle.get()
+        try:
+            return agent.run(prompt, job_id)
+        finally:
+            self._idle.put(agent)
+
+    def stats(self):
+        return {"agents": len(self.agents), "requests": sum(a.served for a in self.agents),
+                "restarts": sum(max(0, a.restarts) for a in self.agents)}
+
+    def close(self):
+        for agent in self.agents:
+            agent.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,27 +1,862 @@
 #!/usr/bin/env python3
-import argparse, os, shutil, subprocess, uuid, json, time
+import argparse, os, shutil, subprocess, uuid, json, time, threading, atexit, hashlib, fcntl, asyncio, gzip, signal
+from collections import deque
+from contextlib import contextmanager
 from pathlib import Path
+try:
+    from runner import storage
+except ImportError:  # run as a script: python runner/run_agent_in_sandbox.py
+    import storage
 HOST_DATA_DIR = os.getenv("HOST_DATA_DIR")
 DATA_DIR = os.environ.get("NLE_DATA_DIR", "/data")
 Path(DATA_DIR).mkdir(parents=True, exist_ok=True)
+_POOL_LOCK = threading.Lock()
+DOCKER_BIN = os.getenv("NLE_DOCKER_BIN", "docker")
+SANDBOX_IMAGE = os.getenv("NLE_SANDBOX_IMAGE", "python:3.11-slim")
+# How long a `docker version` probe result is reused by in-process callers
+DOCKER_CHECK_TTL = float(os.getenv("NLE_DOCKER_CHECK_TTL", "30"))
+_DOCKER_CHECK = {"ok": None, "at": 0.0}
+# Warm container pool: idle containers kept per profile and uses before recycling
+WARM_POOL = os.getenv("NLE_WARM_POOL", "0") == "1"
+POOL_SIZE = int(os.getenv("NLE_POOL_SIZE", "4"))
+POOL_MAX_USES = int(os.getenv("NLE_POOL_MAX_USES", "20"))
+# Content-addressed extraction cache shared (read-only) by every job of an archive
+EXTRACT_CACHE = os.getenv("NLE_EXTRACT_CACHE", "1") == "1"
+EXTRACT_CACHE_DIR = os.getenv("NLE_EXTRACT_CACHE_DIR", os.path.join(DATA_DIR, "agent_cache"))
+EXTRACT_CACHE_QUOTA_MB = int(os.getenv("NLE_EXTRACT_CACHE_QUOTA_MB", "2048"))
+# Streaming capture: bytes kept in memory from the start / end of each stream,
+# and whether the full output is spilled to <job_id>_<stream>.log.gz
+CAPTURE_HEAD_BYTES = int(os.getenv("NLE_CAPTURE_HEAD_BYTES", "2000"))
+CAPTURE_TAIL_BYTES = int(os.getenv("NLE_CAPTURE_TAIL_BYTES", "2000"))
+CAPTURE_SPILL = os.getenv("NLE_CAPTURE_SPILL", "1") == "1"
+# Longest stdout line still inspected for {"tool_calls": ...}
+MAX_TOOL_LINE_BYTES = 1 << 20
+# Per-job JSONL event log: cap on per-line output events, line length kept
+# per event, and the interval between resource_sample events
+TRACE_EVENTS = os.getenv("NLE_TRACE_EVENTS", "1") == "1"
+TRACE_MAX_LINE_EVENTS = int(os.getenv("NLE_TRACE_MAX_LINE_EVENTS", "5000"))
+TRACE_LINE_CHARS = int(os.getenv("NLE_TRACE_LINE_CHARS", "2000"))
+TRACE_SAMPLE_SECONDS = float(os.getenv("NLE_TRACE_SAMPLE_SECONDS", "1.0"))
+# How often CPU / RSS of a running job are sampled (peak RSS comes from these)
+RESOURCE_SAMPLE_SECONDS = float(os.getenv("NLE_RESOURCE_SAMPLE_SECONDS", "0.25"))
+# Each `docker stats --no-stream` call blocks for a second or two, so the
+# fallback used when a container's cgroup is not visible samples far less often
+DOCKER_STATS_SAMPLE_SECONDS = float(os.getenv("NLE_DOCKER_STATS_SAMPLE_SECONDS", "5.0"))
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+_CLK_TCK = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_MEM_UNITS = {"b": 1, "kib": 1024, "kb": 1000, "mib": 1024 ** 2, "mb": 1000 ** 2, "gib": 1024 ** 3, "gb": 1000 ** 3}
 
 def extract_archive(archive_path: str, dest: str):
     shutil.unpack_archive(archive_path, dest)
 
-def docker_available() -> bool:
+def sha256_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _pid_alive(pid: int) -> bool:
     try:
-        subprocess.run(["docker", "version"], capture_output=True, check=True, timeout=5)
+        os.kill(pid, 0)
         return True
-    except Exception:
+    except ProcessLookupError:
         return False
+    except PermissionError:
+        return True
 
-def run_in_docker(workdir: str, cmd: str, job_id: str, timeout_s: int, memory: str, cpus: str):
-    container_name = f"nle_sandbox_{job_id}"
+class ExtractionCache:
+    """
+    Extracts each archive once into <cache_dir>/<sha256>/ and shares that
+    directory between jobs. The index (entries, holders, LRU timestamps) is a
+    JSON file guarded by flock so concurrent runner processes agree on it.
+    """
+    def __init__(self, cache_dir: str = EXTRACT_CACHE_DIR, quota_bytes: int = EXTRACT_CACHE_QUOTA_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.quota_bytes = quota_bytes
+        self.index_path = os.path.join(cache_dir, "index.json")
+        self._thread_lock = threading.Lock()
+        Path(cache_dir).mkdir(parents=True, exist_ok=True)
+
+    @contextmanager
+    def _locked_index(self):
+        with self._thread_lock, open(os.path.join(self.cache_dir, ".lock"), "a") as lf:
+            fcntl.flock(lf, fcntl.LOCK_EX)
+            try:
+                try:
+                    with open(self.index_path, "r", encoding="utf-8") as f:
+                        index = json.load(f)
+                except (OSError, json.JSONDecodeError):
+                    index = {}
+                index.setdefault("entries", {})
+                index.setdefault("archives", {})
+                yield index
+                tmp = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(index, f)
+                os.replace(tmp, self.index_path)
+            finally:
+                fcntl.flock(lf, fcntl.LOCK_UN)
+
+    def _archive_digest(self, index: dict, archive: str) -> str:
+        # Re-hash only when the archive file itself changed
+        st = os.stat(archive)
+        stamp = f"{os.path.abspath(archive)}|{st.st_mtime_ns}|{st.st_size}"
+        digest = index["archives"].get(stamp)
+        if not digest:
+            digest = sha256_file(archive)
+            index["archives"] = {k: v for k, v in index["archives"].items() if not k.startswith(os.path.abspath(archive) + "|")}
+            index["archives"][stamp] = digest
+        return digest
+
+    def acquire(self, archive: str):
+        """Returns (digest, path) of the extracted archive and pins it until release()."""
+        with self._locked_index() as index:
+            digest = self._archive_digest(index, archive)
+            path = os.path.join(self.cache_dir, digest)
+            entry = index["entries"].get(digest)
+            if entry is None or not os.path.isdir(path):
+                tmp = os.path.join(self.cache_dir, f".{digest}.{uuid.uuid4().hex}")
+                try:
+                    extract_archive(archive, tmp)
+                    shutil.rmtree(path, ignore_errors=True)
+                    os.rename(tmp, path)
+                finally:
+                    shutil.rmtree(tmp, ignore_errors=True)
+                entry = {"size": _dir_size(path), "holders": [], "hits": 0}
+                index["entries"][digest] = entry
+            else:
+                entry["hits"] = entry.get("hits", 0) + 1
+            entry["holders"].append(os.getpid())
+            entry["last_used"] = time.time()
+            self._evict(index)
+        return digest, path
+
+    def release(self, digest: str):
+        with self._locked_index() as index:
+            entry = index["entries"].get(digest)
+            if entry is None:
+                return
+            if os.getpid() in entry["holders"]:
+                entry["holders"].remove(os.getpid())
+            entry["last_used"] = time.time()
+            self._evict(index)
+
+    def _evict(self, index: dict):
+        entries = index["entries"]
+        for entry in entries.values():
+            # Holders from crashed runner processes must not pin entries forever
+            entry["holders"] = [pid for pid in entry["holders"] if _pid_alive(pid)]
+        total = sum(e.get("size", 0) for e in entries.values())
+        for digest in sorted(entries, key=lambda d: entries[d].get("last_used", 0)):
+            if total <= self.quota_bytes:
+                break
+            if entries[digest]["holders"]:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, digest), ignore_errors=True)
+            total -= entries.pop(digest).get("size", 0)
+
+_EXTRACTION_CACHE = None
+
+def get_extraction_cache() -> ExtractionCache:
+    global _EXTRACTION_CACHE
+    with _POOL_LOCK:
+        if _EXTRACTION_CACHE is None:
+            _EXTRACTION_CACHE = ExtractionCache()
+        return _EXTRACTION_CACHE
+
+def docker_available() -> bool:
+    now = time.monotonic()
+    if _DOCKER_CHECK["ok"] is not None and now - _DOCKER_CHECK["at"] < DOCKER_CHECK_TTL:
+        return _DOCKER_CHECK["ok"]
+    try:
+        subprocess.run([DOCKER_BIN, "version"], capture_output=True, check=True, timeout=5)
+        ok = True
+    except Exception:
+        ok = False
+    _DOCKER_CHECK.update(ok=ok, at=now)
+    return ok
+
+def host_mount_path(workdir: str) -> str:
     if HOST_DATA_DIR:
         rel = os.path.relpath(workdir, DATA_DIR)
-        host_path = os.path.join(HOST_DATA_DIR, rel)
+        return os.path.join(HOST_DATA_DIR, rel)
+    return os.path.abspath(workdir)
+
+class ContainerPool:
+    """
+    Keeps pre-started, network-isolated sandbox containers per
+    (archive, memory, cpus) profile and leases them out via `docker exec`.
+    The first lease of a profile pre-warms the rest of its pool in the
+    background, so the jobs that follow (a suite fanning out) start warm.
+    """
+    def __init__(self, size: int = POOL_SIZE, max_uses: int = POOL_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = {}   # profile -> [container dict]
+        self._warmed = set()  # profiles whose pre-warm has been started
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def profile(archive: str, memory: str, cpus: str):
+        # mtime/size guard against an archive being replaced in place
+        st = os.stat(archive)
+        return (os.path.abspath(archive), st.st_mtime_ns, st.st_size, str(memory), str(cpus))
+
+    def _start(self, profile, host_path: str):
+        name = f"nle_pool_{uuid.uuid4().hex[:12]}"
+        docker_cmd = [
+            DOCKER_BIN,"run","-d","--rm",
+            "--name",name,
+            "--cpus",profile[4],
+            "--memory",profile[3],
+            "--network","none",
+            "-v",f"{host_path}:/agent:ro",
+            SANDBOX_IMAGE,
+            "sleep","infinity"
+        ]
+        # The container serves the extracted archive as /agent for as long as it lives,
+        # so it holds the cache entry too; eviction would otherwise empty its mount
+        digest = get_extraction_cache().acquire(profile[0])[0] if EXTRACT_CACHE else None
+        try:
+            subprocess.run(docker_cmd, capture_output=True, text=True, check=True, timeout=60)
+        except Exception:
+            if digest:
+                get_extraction_cache().release(digest)
+            raise
+        return {"name": name, "profile": profile, "uses": 0, "digest": digest}
+
+    def prewarm(self, profile, host_path: str, n: int = None):
+        n = self.size if n is None else min(n, self.size)
+        with self._lock:
+            missing = n - len(self._idle.get(profile, []))
+        for _ in range(max(0, missing)):
+            c = self._start(profile, host_path)
+            with self._lock:
+                idle = self._idle.setdefault(profile, [])
+                # Released containers may have filled the pool meanwhile
+                if len(idle) < self.size:
+                    idle.append(c)
+                    continue
+            self.discard(c)
+
+    def _prewarm_background(self, profile, host_path: str, n: int):
+        try:
+            self.prewarm(profile, host_path, n)
+        except Exception as e:
+            print(f"WARNING: could not pre-warm containers for {profile[0]}: {e}")
+
+    def lease(self, profile, host_path: str):
+        """Returns (container, warm) where warm is False if it had to be started."""
+        with self._lock:
+            idle = self._idle.get(profile)
+            if idle:
+                return idle.pop(), True
+            first = profile not in self._warmed
+            self._warmed.add(profile)
+        if first and self.size > 1:
+            # This lease starts its own container; fill the rest of the pool meanwhile
+            threading.Thread(target=self._prewarm_background, args=(profile, host_path, self.size - 1), daemon=True).start()
+        return self._start(profile, host_path), False
+
+    def release(self, container, healthy: bool = True):
+        container["uses"] += 1
+        if healthy and container["uses"] < self.max_uses and self._reset(container):
+            with self._lock:
+                idle = self._idle.setdefault(container["profile"], [])
+                if len(idle) < self.size:
+                    idle.append(container)
+                    return
+        self.discard(container)
+
+    def _reset(self, container) -> bool:
+        # /agent is read-only; kill leftover processes (kill -1 spares PID 1 and
+        # the caller) and scrub the writable scratch space between tests
+        try:
+            proc = subprocess.run(
+                [DOCKER_BIN,"exec",container["name"],"bash","-c",
+                 "kill -9 -1 2>/dev/null; rm -rf /tmp/* /tmp/.[!.]* /root/* 2>/dev/null; true"],
+                capture_output=True, timeout=10)
+            return proc.returncode == 0
+        except Exception:
+            return False
+
+    def discard(self, container):
+        try:
+            subprocess.run([DOCKER_BIN,"rm","-f",container["name"]], capture_output=True, timeout=10)
+        except Exception:
+            pass
+        digest = container.pop("digest", None)
+        if digest:
+            try:
+                get_extraction_cache().release(digest)
+            except OSError as e:
+                # Also runs from atexit, when the data dir may already be gone
+                print(f"WARNING: could not release extraction cache entry {digest[:12]}: {e}")
+
+    def shutdown(self):
+        with self._lock:
+            containers = [c for idle in self._idle.values() for c in idle]
+            self._idle = {}
+        for c in containers:
+            self.discard(c)
+
+_POOL = None
+
+def get_container_pool() -> ContainerPool:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ContainerPool()
+            atexit.register(_POOL.shutdown)
+        return _POOL
+
+class TraceEventLog:
+    """
+    Append-only JSONL event stream for one job (<job_id>_events.jsonl), using
+    the trace event model: ts, sequence, type, actor, content, metadata,
+    correlation_id, attempt. Each event is written and flushed as it happens
+    so readers can tail the file while the job runs. A retried job (same job
+    id) appends its events as the next attempt, numbered after the last one.
+    """
+    def __init__(self, job_id: str, path: str = None):
+        self.job_id = job_id
+        self.path = path or os.path.join(DATA_DIR, f"{job_id}_events.jsonl")
+        self.attempt, self._sequence = self._resume()
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._line_events = {}
+
+    def _resume(self):
+        """(attempt, last sequence) for a new run, from the last event already in the log."""
+        try:
+            with open(self.path, "r+b") as f:
+                size = f.seek(0, os.SEEK_END)
+                f.seek(max(0, size - 65536))
+                tail = f.read()
+                end = tail.rfind(b"\n")
+                # Drop a partial line left by an attempt that was killed mid-write
+                f.truncate(size - len(tail) + end + 1)
+                last = json.loads(tail[tail.rfind(b"\n", 0, max(end, 0)) + 1:end]) if end >= 0 else None
+        except (OSError, ValueError):
+            return 1, 0
+        if not isinstance(last, dict):
+            return 1, 0
+        return last.get("attempt", 1) + 1, last.get("sequence", 0)
+
+    def emit(self, type: str, content=None, actor: str = "runner", **metadata):
+        with self._lock:
+            if self._f is None:
+                return
+            self._sequence += 1
+            event = {
+                "ts": time.time(),
+                "sequence": self._sequence,
+                "type": type,
+                "actor": actor,
+                "content": content,
+                "metadata": metadata,
+                "correlation_id": self.job_id,
+                "attempt": self.attempt,
+            }
+            self._f.write(json.dumps(event) + "\n")
+            self._f.flush()
+
+    def line(self, stream: str, text: str):
+        """Emits one output line event, up to TRACE_MAX_LINE_EVENTS per stream."""
+        n = self._line_events.get(stream, 0) + 1
+        self._line_events[stream] = n
+        if n <= TRACE_MAX_LINE_EVENTS:
+            self.emit(stream, text[:TRACE_LINE_CHARS], actor="agent", truncated=len(text) > TRACE_LINE_CHARS)
+        elif n == TRACE_MAX_LINE_EVENTS + 1:
+            self.emit("line_limit", f"{stream} line events capped at {TRACE_MAX_LINE_EVENTS}", stream=stream)
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+
+def read_events(path: str, cursor: int = 0, limit: int = 500, offset: int = None, types=None):
+    """
+    Pages through a JSONL event log without loading it whole. Start either at
+    a byte `cursor` (as returned in next_cursor, for incremental tailing) or
+    at an event index `offset`. A trailing partial line (event still being
+    written) is left for the next read.
+    """
+    events = []
+    with open(path, "rb") as f:
+        pos = 0
+        if offset is not None:
+            for _ in range(offset):
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    f.seek(pos)
+                    break
+                pos += len(line)
+        else:
+            f.seek(cursor)
+            pos = cursor
+        while len(events) < limit:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            pos += len(line)
+            event = json.loads(line)
+            if types and event.get("type") not in types:
+                continue
+            events.append(event)
+        eof = f.readline() == b""
+    return {"events": events, "next_cursor": pos, "eof": eof}
+
+def _tool_calls_from_line(line: str):
+    s = line.strip()
+    if s.startswith("{") and '"tool_calls"' in s:
+        try:
+            obj = json.loads(s)
+            if isinstance(obj, dict) and "tool_calls" in obj:
+                return obj.get("tool_calls") or []
+        except json.JSONDecodeError:
+            pass
+    return []
+
+def parse_tool_calls(stdout: str):
+    out = []
+    for line in stdout.splitlines():
+        out += _tool_calls_from_line(line)
+    return out
+
+class StreamCapture:
+    """
+    Bounded capture of one output stream: keeps the first `head_bytes` and a
+    ring buffer of the last `tail_bytes`, optionally spills everything to a
+    gzip file, and (for stdout) parses tool_calls lines as they arrive.
+    """
+    def __init__(self, head_bytes: int = CAPTURE_HEAD_BYTES, tail_bytes: int = CAPTURE_TAIL_BYTES,
+                 spill_path: str = None, parse_tools: bool = False, on_line=None, on_tool_calls=None):
+        self.head_bytes = head_bytes
+        self.tail_bytes = tail_bytes
+        self.head = bytearray()
+        self._tail = deque()
+        self._tail_size = 0
+        self.total = 0
+        self.spill_path = spill_path
+        self._spill = gzip.open(spill_path, "wb") if spill_path else None
+        self.parse_tools = parse_tools
+        self.on_line = on_line
+        self.on_tool_calls = on_tool_calls
+        self._split_lines = parse_tools or on_line is not None
+        self.tool_calls = []
+        self._partial = b""
+        self._partial_overflow = False
+
+    def feed(self, chunk: bytes):
+        self.total += len(chunk)
+        if self._spill:
+            self._spill.write(chunk)
+        if self._split_lines:
+            self._scan(chunk)
+        room = self.head_bytes - len(self.head)
+        if room > 0:
+            self.head += chunk[:room]
+            chunk = chunk[room:]
+        if chunk and self.tail_bytes > 0:
+            self._tail.append(chunk)
+            self._tail_size += len(chunk)
+            while self._tail and self._tail_size - len(self._tail[0]) >= self.tail_bytes:
+                self._tail_size -= len(self._tail.popleft())
+
+    def _scan(self, chunk: bytes):
+        lines = (self._partial + chunk).split(b"\n")
+        self._partial = lines.pop()
+        for line in lines:
+            if not self._partial_overflow:
+                self._handle_line(line.decode("utf-8", "replace"))
+            self._partial_overflow = False
+        if len(self._partial) > MAX_TOOL_LINE_BYTES:
+            # A runaway line cannot be a tool_calls record we want; stop buffering it
+            self._partial = b""
+            self._partial_overflow = True
+
+    def _handle_line(self, line: str):
+        if self.on_line:
+            self.on_line(line)
+        if self.parse_tools:
+            calls = _tool_calls_from_line(line)
+            if calls:
+                self.tool_calls += calls
+                if self.on_tool_calls:
+                    self.on_tool_calls(calls)
+
+    def close(self):
+        if self._split_lines and self._partial and not self._partial_overflow:
+            self._handle_line(self._partial.decode("utf-8", "replace"))
+        self._partial = b""
+        if self._spill:
+            self._spill.close()
+            self._spill = None
+
+    @property
+    def truncated(self) -> bool:
+        return self.total > len(self.head) + min(self._tail_size, self.tail_bytes)
+
+    def text(self) -> str:
+        tail = b"".join(self._tail)[-self.tail_bytes:] if self.tail_bytes > 0 else b""
+        head = bytes(self.head).decode("utf-8", "replace")
+        if not self.truncated:
+            return head + tail.decode("utf-8", "replace")
+        omitted = self.total - len(self.head) - len(tail)
+        return head + f"\n...[{omitted} bytes omitted]...\n" + tail.decode("utf-8", "replace")
+
+def job_captures(job_id: str = None, events: TraceEventLog = None):
+    """The bounded (stdout, stderr) captures of one job, spilling to <job_id>_stdout/stderr.log.gz."""
+    spill = CAPTURE_SPILL and job_id
+    out = StreamCapture(spill_path=os.path.join(DATA_DIR, f"{job_id}_stdout.log.gz") if spill else None, parse_tools=True,
+                        on_line=(lambda line: events.line("stdout", line)) if events else None,
+                        on_tool_calls=(lambda calls: [events.emit("tool_call", c, actor="agent") for c in calls]) if events else None)
+    err = StreamCapture(spill_path=os.path.join(DATA_DIR, f"{job_id}_stderr.log.gz") if spill else None,
+                        on_line=(lambda line: events.line("stderr", line)) if events else None)
+    return out, err
+
+def _feed_stdin(pipe, data: bytes):
+    try:
+        pipe.write(data)
+    except OSError:
+        pass  # the agent exited (or closed stdin) without reading its input
+    finally:
+        try:
+            pipe.close()
+        except OSError:
+            pass
+
+def _pump(pipe, capture: StreamCapture):
+    try:
+        for chunk in iter(lambda: pipe.read1(65536), b""):
+            capture.feed(chunk)
+    except (OSError, ValueError):
+        pass
+
+def _scan_proc_groups():
+    """{pgid: (RSS bytes, CPU ticks)} summed over every live process, from one pass over /proc."""
+    groups = {}
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat", "rb") as f:
+                data = f.read()
+        except OSError:
+            continue
+        # Fields after "(comm)": state ppid pgrp ... utime(11) stime(12) ... rss(21)
+        fields = data[data.rindex(b")") + 2:].split()
+        rss, ticks = groups.get(int(fields[2]), (0, 0))
+        groups[int(fields[2])] = (rss + int(fields[21]) * _PAGE_SIZE, ticks + int(fields[11]) + int(fields[12]))
+    return groups
+
+# Latest /proc scan, shared by every job's sampler so concurrent jobs cost one scan per interval
+_proc_scan = {"at": None, "groups": {}}
+_proc_scan_lock = threading.Lock()
+
+def _proc_group_usage(pgid: int, max_age: float = 0.0):
+    """
+    RSS bytes and CPU seconds of a process group, from the shared /proc scan
+    when it is at most `max_age` seconds old, else from a new one.
+    """
+    with _proc_scan_lock:
+        now = time.monotonic()
+        if _proc_scan["at"] is None or now - _proc_scan["at"] >= max_age:
+            _proc_scan["groups"], _proc_scan["at"] = _scan_proc_groups(), now
+        rss, ticks = _proc_scan["groups"].get(pgid, (0, 0))
+    return rss, ticks / _CLK_TCK
+
+def _parse_mem(text: str) -> int:
+    num = text.strip().rstrip("BbIiKkMmGg")
+    unit = text.strip()[len(num):].lower() or "b"
+    return int(float(num) * _MEM_UNITS.get(unit, 1))
+
+class ResourceSampler:
+    """
+    Tracks CPU seconds and peak RSS of one job: its local process group via
+    /proc (plus the wait4 rusage at exit), or its container via cgroup files,
+    falling back to `docker stats` (at most every DOCKER_STATS_SAMPLE_SECONDS)
+    when the host cgroup tree is not visible.
+    """
+    def __init__(self, pgid: int = None, container: str = None, baseline: bool = False):
+        self.pgid = pgid
+        self.container = container
+        self.baseline = baseline
+        self.source = "proc" if pgid else None
+        self.peak_rss_bytes = None
+        self.rss_bytes = None
+        self.cpu_seconds = None
+        self.samples = 0
+        self._cgroup = None
+        self._cpu0 = None
+        self._last = None
+        self._usage = None
+        self._stats_at = None
+
+    def _resolve_cgroup(self):
+        # A failed lookup is retried no more often than the docker stats fallback
+        self._stats_at = time.monotonic()
+        cid = subprocess.run([DOCKER_BIN, "inspect", "-f", "{{.Id}}", self.container],
+                             capture_output=True, text=True, timeout=5).stdout.strip()
+        if not cid:
+            return False
+        for v2 in (f"/sys/fs/cgroup/system.slice/docker-{cid}.scope", f"/sys/fs/cgroup/docker/{cid}"):
+            if os.path.exists(os.path.join(v2, "memory.current")):
+                self._cgroup, self.source, self._stats_at = ("v2", v2), "cgroup", None
+                return True
+        v1_mem, v1_cpu = f"/sys/fs/cgroup/memory/docker/{cid}", f"/sys/fs/cgroup/cpuacct/docker/{cid}"
+        if os.path.exists(os.path.join(v1_mem, "memory.usage_in_bytes")):
+            self._cgroup, self.source, self._stats_at = ("v1", v1_mem, v1_cpu), "cgroup", None
+            return True
+        self.source = "docker_stats"
+        return True
+
+    def _container_usage(self):
+        if self.source is None and not self._resolve_cgroup():
+            return None
+        if self._cgroup and self._cgroup[0] == "v2":
+            base = self._cgroup[1]
+            with open(os.path.join(base, "memory.current")) as f:
+                rss = int(f.read())
+            with open(os.path.join(base, "cpu.stat")) as f:
+                usec = next(int(l.split()[1]) for l in f if l.startswith("usage_usec"))
+            return rss, usec / 1e6
+        if self._cgroup:
+            with open(os.path.join(self._cgroup[1], "memory.usage_in_bytes")) as f:
+                rss = int(f.read())
+            with open(os.path.join(self._cgroup[2], "cpuacct.usage")) as f:
+                return rss, int(f.read()) / 1e9
+        self._stats_at = time.monotonic()
+        out = subprocess.run([DOCKER_BIN, "stats", "--no-stream", "--format", "{{.MemUsage}}|{{.CPUPerc}}", self.container],
+                             capture_output=True, text=True, timeout=5).stdout.strip()
+        if "|" not in out:
+            return None
+        mem, cpu = out.split("|", 1)
+        # docker stats only reports a CPU percentage; integrate it over the sample interval
+        now = time.monotonic()
+        cpu_total = (self.cpu_seconds or 0.0) + (float(cpu.strip().rstrip("%") or 0) / 100.0) * (now - self._last if self._last else 0)
+        self._last = now
+        return _parse_mem(mem.split("/")[0]), cpu_total
+
+    def sample(self, fresh: bool = False):
+        """
+        Records one sample. Local jobs read the shared /proc scan unless
+        `fresh` (a baseline or final reading) asks for a new one.
+        """
+        if self._stats_at is not None and time.monotonic() - self._stats_at < DOCKER_STATS_SAMPLE_SECONDS:
+            return self._usage
+        try:
+            usage = _proc_group_usage(self.pgid, 0.0 if fresh else RESOURCE_SAMPLE_SECONDS) if self.pgid else self._container_usage()
+        except (OSError, ValueError, StopIteration, subprocess.SubprocessError):
+            usage = None
+        if not usage:
+            return None
+        rss, cpu = usage
+        if self.baseline and self._cpu0 is None and self.source in ("cgroup", "proc"):
+            # A warm container's cgroup (or a persistent agent) counts earlier work too; measure from here
+            self._cpu0 = cpu
+        cpu -= self._cpu0 or 0.0
+        self.samples += 1
+        self.rss_bytes = rss
+        self.peak_rss_bytes = max(self.peak_rss_bytes or 0, rss)
+        self.cpu_seconds = max(self.cpu_seconds or 0.0, cpu)
+        self._usage = {"rss_bytes": rss, "cpu_seconds": round(self.cpu_seconds, 3)}
+        return self._usage
+
+    def finish(self, wall_seconds: float, rusage=None):
+        if rusage is not None and self.pgid:
+            # wait4 covers the child and every descendant it reaped, even short-lived ones
+            self.cpu_seconds = max(self.cpu_seconds or 0.0, rusage.ru_utime + rusage.ru_stime)
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, rusage.ru_maxrss * 1024)
+            self.source = "proc+wait4"
+        return {
+            "wall_seconds": round(wall_seconds, 3),
+            "cpu_seconds": round(self.cpu_seconds, 3) if self.cpu_seconds is not None else None,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "samples": self.samples,
+            "source": self.source,
+        }
+
+def _sample_loop(sampler: ResourceSampler, out: StreamCapture, err: StreamCapture, events: TraceEventLog, start: float, stop: threading.Event):
+    last_event = start
+    while not stop.wait(RESOURCE_SAMPLE_SECONDS):
+        usage = sampler.sample()
+        now = time.monotonic()
+        if events and TRACE_SAMPLE_SECONDS > 0 and now - last_event >= TRACE_SAMPLE_SECONDS:
+            last_event = now
+            events.emit("resource_sample", {
+                "wall_seconds": round(now - start, 3),
+                "stdout_bytes": out.total,
+                "stderr_bytes": err.total,
+                **(usage or {}),
+            }, source=sampler.source)
+
+def _wait_with_rusage(proc, timeout_s):
+    """
+    Popen.wait() equivalent built on os.wait4 so the child's rusage is kept.
+    Raises subprocess.TimeoutExpired like Popen.wait.
+    """
+    deadline = time.monotonic() + timeout_s if timeout_s else None
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, rusage = os.wait4(proc.pid, os.WNOHANG if deadline else 0)
+        except ChildProcessError:
+            proc.wait()
+            return None
+        if pid == proc.pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return rusage
+        if time.monotonic() >= deadline:
+            raise subprocess.TimeoutExpired(proc.args, timeout_s)
+        time.sleep(delay)
+        delay = min(delay * 2, 0.02)
+
+def run_streaming(argv, timeout_s: int, job_id: str = None, env: dict = None, events: TraceEventLog = None,
+                  container: str = None, warm: bool = False, stdin_data: bytes = None):
+    """
+    Runs `argv` reading stdout/stderr incrementally into bounded StreamCaptures;
+    `stdin_data` (the test prompt) is written to its stdin, which is then closed.
+    Returns a dict with returncode, timed_out, bounded stdout/stderr text,
+    byte counts, spill file paths, the tool_calls parsed from stdout and the
+    job's resource usage (of `container` when given, else of the local process group).
+    With `events`, process start/exit, every output line, each tool call and
+    periodic resource samples are appended to the job's event log.
+    """
+    out, err = job_captures(job_id, events)
+    start = time.monotonic()
+    # Own process group so a timeout also kills whatever the shell started
+    proc = subprocess.Popen(argv, stdin=subprocess.DEVNULL if stdin_data is None else subprocess.PIPE,
+                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=env, start_new_session=True)
+    if events:
+        events.emit("process_start", argv[-1], pid=proc.pid, timeout_s=timeout_s)
+    sampler = ResourceSampler(container=container, baseline=warm) if container else ResourceSampler(pgid=proc.pid)
+    if warm:
+        sampler.sample()
+    pumps = [threading.Thread(target=_pump, args=(proc.stdout, out), daemon=True),
+             threading.Thread(target=_pump, args=(proc.stderr, err), daemon=True)]
+    if stdin_data is not None:
+        pumps.append(threading.Thread(target=_feed_stdin, args=(proc.stdin, stdin_data), daemon=True))
+    stop_sampling = threading.Event()
+    if RESOURCE_SAMPLE_SECONDS > 0:
+        pumps.append(threading.Thread(target=_sample_loop, args=(sampler, out, err, events, start, stop_sampling), daemon=True))
+    for t in pumps:
+        t.start()
+    timed_out = False
+    try:
+        rusage = _wait_with_rusage(proc, timeout_s)
+    except subprocess.TimeoutExpired:
+        timed_out = True
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+        rusage = _wait_with_rusage(proc, None)
+    wall = time.monotonic() - start
+    if container:
+        sampler.sample()
+    stop_sampling.set()
+    for t in pumps:
+        t.join(timeout=5)
+    out.close()
+    err.close()
+    resources = sampler.finish(wall, None if container else rusage)
+    if events:
+        events.emit("process_exit", None, exit_code=proc.returncode, timed_out=timed_out,
+                    stdout_bytes=out.total, stderr_bytes=err.total, **resources)
+    return {
+        "returncode": proc.returncode,
+        "timed_out": timed_out,
+        "stdout": out.text(),
+        "stderr": err.text(),
+        "tool_calls": out.tool_calls,
+        "stdout_bytes": out.total,
+        "stderr_bytes": err.total,
+        "stdout_truncated": out.truncated,
+        "stderr_truncated": err.truncated,
+        "stdout_log": out.spill_path,
+        "stderr_log": err.spill_path,
+        "resources": resources,
+    }
+
+def _streamed_result(run: dict, start: float, **extra):
+    result = {
+        "exit_code": run["returncode"],
+        "stdout": run["stdout"],
+        "stderr": run["stderr"],
+        "duration_seconds": round(time.time() - start, 3),
+        "streamed": True,
+    }
+    for k in ("tool_calls", "stdout_bytes", "stderr_bytes", "stdout_truncated", "stderr_truncated", "stdout_log", "stderr_log", "resources"):
+        result[k] = run[k]
+    result.update(extra)
+    return result
+
+def run_in_warm_container(workdir: str, cmd: str, profile, timeout_s: int, job_id: str = None, events: TraceEventLog = None,
+                          stdin_data: bytes = None):
+    host_path = host_mount_path(workdir)
+    if not os.path.isdir(host_path):
+        return {
+            "exit_code": -7,
+            "stdout": "",
+            "stderr": f"Host path missing before docker run: {host_path}",
+            "duration_seconds": 0,
+            "docker_cmd": None
+        }
+    pool = get_container_pool()
+    start = time.time()
+    try:
+        container, warm = pool.lease(profile, host_path)
+    except Exception as e:
+        return {
+            "exit_code": -2,
+            "stdout": "",
+            "stderr": f"Unexpected docker error: {e}",
+            "duration_seconds": round(time.time() - start, 3),
+            "docker_cmd": None,
+        }
+    # -i keeps stdin attached so the prompt reaches the agent
+    docker_cmd = [DOCKER_BIN,"exec",*(["-i"] if stdin_data is not None else []),container["name"],"bash","-lc",f"cd /agent && ls -l && {cmd}"]
+    try:
+        if events:
+            events.emit("container_lease", container["name"], warm=warm)
+        run = run_streaming(docker_cmd, timeout_s, job_id, events=events, container=container["name"], warm=True, stdin_data=stdin_data)
+    except Exception as e:
+        pool.discard(container)
+        return {
+            "exit_code": -2,
+            "stdout": "",
+            "stderr": f"Unexpected docker error: {e}",
+            "duration_seconds": round(time.time() - start, 3),
+            "docker_cmd": " ".join(docker_cmd),
+            "container": "warm" if warm else "cold",
+        }
+    if run["timed_out"]:
+        # The exec'd process keeps running inside the container, so recycle it
+        pool.discard(container)
+        run["returncode"] = -1
+        run["stderr"] += f"\nTIMEOUT after {timeout_s}s"
     else:
-        host_path = os.path.abspath(workdir)
+        pool.release(container, healthy=True)
+    return _streamed_result(run, start, docker_cmd=" ".join(docker_cmd), container="warm" if warm else "cold")
+
+def run_in_docker(workdir: str, cmd: str, job_id: str, timeout_s: int, memory: str, cpus: str, events: TraceEventLog = None,
+                  stdin_data: bytes = None):
+    container_name = f"nle_sandbox_{job_id}"
+    host_path = host_mount_path(workdir)
     if not os.path.isdir(host_path):
         return {
             "exit_code": -7,
@@ -31,37 +866,18 @@ def run_in_docker(workdir: str, cmd: str, job_id: str, timeout_s: int, memory: s
             "docker_cmd": None
         }
     docker_cmd = [
-        "docker","run","--rm",
+        DOCKER_BIN,"run","--rm",*(["-i"] if stdin_data is not None else []),
         "--name",container_name,
         "--cpus",str(cpus),
         "--memory",memory,
         "--network","none",
         "-v",f"{host_path}:/agent:ro",
-        "python:3.11-slim",
+        SANDBOX_IMAGE,
         "bash","-lc",f"cd /agent && ls -l && {cmd}"
     ]
     start = time.time()
     try:
-        proc = subprocess.run(docker_cmd, capture_output=True, text=True, timeout=timeout_s)
-        return {
-            "exit_code": proc.returncode,
-            "stdout": proc.stdout,
-            "stderr": proc.stderr,
-            "duration_seconds": round(time.time() - start, 3),
-            "docker_cmd": " ".join(docker_cmd),
-        }
-    except subprocess.TimeoutExpired as e:
-        try:
-            subprocess.run(["docker","rm","-f",container_name], capture_output=True, timeout=5)
-        except Exception:
-            pass
-        return {
-            "exit_code": -1,
-            "stdout": (getattr(e,"stdout","") or ""),
-            "stderr": (getattr(e,"stderr","") or "") + f"\nTIMEOUT after {timeout_s}s",
-            "duration_seconds": timeout_s,
-            "docker_cmd": " ".join(docker_cmd),
-        }
+        run = run_streaming(docker_cmd, timeout_s, job_id, events=events, container=container_name, stdin_data=stdin_data)
     except Exception as e:
         return {
             "exit_code": -2,
@@ -70,58 +886,99 @@ def run_in_docker(workdir: str, cmd: str, job_id: str, timeout_s: int, memory: s
             "duration_seconds": round(time.time() - start, 3),
             "docker_cmd": " ".join(docker_cmd),
         }
-        
-def parse_tool_calls(stdout: str):
-    out = []
-    for line in stdout.splitlines():
-        s = line.strip()
-        if s.startswith("{") and '"tool_calls"' in s:
-            try:
-                obj = json.loads(s)
-                if isinstance(obj, dict) and "tool_calls" in obj:
-                    out += obj.get("tool_calls") or []
-            except json.JSONDecodeError:
-                pass
-    return out
+    if run["timed_out"]:
+        try:
+            subprocess.run([DOCKER_BIN,"rm","-f",container_name], capture_output=True, timeout=5)
+        except Exception:
+            pass
+        run["returncode"] = -1
+        run["stderr"] += f"\nTIMEOUT after {timeout_s}s"
+    return _streamed_result(run, start, docker_cmd=" ".join(docker_cmd), container="cold")
+
 
-def write_trace(job_id: str, archive_path: str, cmd: str, result: dict, workdir: str) -> str:
+# hook(trace, path) is called after each trace is written; the API layer registers
+# its run index here (api/tasks/sandbox_job.py), so the runner never imports it
+TRACE_HOOKS = []
+
+def add_trace_hook(hook):
+    if hook not in TRACE_HOOKS:
+        TRACE_HOOKS.append(hook)
+
+def write_trace(job_id: str, archive_path: str, cmd: str, result: dict, workdir: str, events: TraceEventLog = None, prompt: str = None) -> str:
+    if events:
+        failed_early = not result.get("streamed") and (result.get("exit_code") or 0) < 0
+        events.emit("job_end", result.get("stderr") if failed_early else None,
+                    exit_code=result.get("exit_code"), duration_seconds=result.get("duration_seconds"))
+        events.close()
     trace = {
         "job_id": job_id,
         "archive_path": os.path.abspath(archive_path),
         "command": cmd,
+        "prompt": prompt,
         "duration_seconds": result.get("duration_seconds"),
         "exit_code": result.get("exit_code"),
-        "stdout_snippet": (result.get("stdout") or "")[:4000],
-        "stderr_snippet": (result.get("stderr") or "")[:4000],
-        "tool_calls": parse_tool_calls(result.get("stdout") or ""),
+        # Streamed output is already bounded to head + tail; the full text is in the .log.gz
+        "stdout_snippet": (result.get("stdout") or "") if result.get("streamed") else (result.get("stdout") or "")[:4000],
+        "stderr_snippet": (result.get("stderr") or "") if result.get("streamed") else (result.get("stderr") or "")[:4000],
+        "tool_calls": result["tool_calls"] if "tool_calls" in result else parse_tool_calls(result.get("stdout") or ""),
+        "stdout_bytes": result.get("stdout_bytes"),
+        "stderr_bytes": result.get("stderr_bytes"),
+        "stdout_truncated": result.get("stdout_truncated", False),
+        "stderr_truncated": result.get("stderr_truncated", False),
+        "stdout_log": result.get("stdout_log"),
+        "stderr_log": result.get("stderr_log"),
+        # wall_seconds (monotonic clock), cpu_seconds, peak_rss_bytes, samples, source
+        "resources": result.get("resources"),
         "workdir": workdir,
-        "files": sorted(os.listdir(workdir))[:100],
+        "files": sorted(os.listdir(workdir))[:100] if os.path.isdir(workdir) else [],
         "docker_cmd": result.get("docker_cmd"),
+        "container": result.get("container"),
         "host_mount_base": HOST_DATA_DIR,  # added
+        "events_path": events.path if events else None,
         "created_at": time.time(),
     }
-    out_path = os.path.join(DATA_DIR, f"{job_id}_trace.json")
-    with open(out_path, "w", encoding="utf-8") as f:
-        json.dump(trace, f, indent=2)
+    # Minified + compressed (<job_id>_trace.json.zst / .gz) when NLE_STORAGE=compact
+    out_path = storage.dump_json(trace, os.path.join(DATA_DIR, f"{job_id}_trace.json"))
+    for hook in TRACE_HOOKS:
+        try:
+            hook(trace, out_path)
+        except Exception as e:
+            print(f"WARNING: trace hook failed for {job_id}: {e}")
     return out_path
 
-def run_job(archive: str, cmd: str, timeout: int, memory: str, cpus: str):
-    job_id = str(uuid.uuid4())
+def run_job(archive: str, cmd: str = "python agent_main.py", timeout: int = 30, memory: str = "256m", cpus: str = "0.5", warm_pool: bool = None,
+            job_id: str = None, prompt: str = None):
+    """
+    Runs one agent job in the sandbox and writes its trace; `prompt`, when
+    given, is delivered on the agent's stdin.
+    Returns (job_id, trace_path). Safe to call from several threads at once.
+    """
+    if warm_pool is None:
+        warm_pool = WARM_POOL
+    job_id = job_id or str(uuid.uuid4())
     workdir = os.path.join(DATA_DIR, "work", job_id)
-    Path(workdir).mkdir(parents=True, exist_ok=True)
+    events = TraceEventLog(job_id) if TRACE_EVENTS else None
+    if events:
+        events.emit("job_start", cmd, archive=os.path.abspath(archive), timeout_s=timeout, memory=memory, cpus=str(cpus))
 
     if not Path(archive).exists():
+        Path(workdir).mkdir(parents=True, exist_ok=True)
         result = {
             "exit_code": -5,
             "stdout": "",
             "stderr": f"Archive not found: {archive}",
             "duration_seconds": 0
         }
-        return job_id, write_trace(job_id, archive, cmd, result, workdir)
+        return job_id, write_trace(job_id, archive, cmd, result, workdir, events, prompt)
 
-    # Extract archive
+    # Extract archive (once per archive content when the cache is enabled)
+    digest = None
     try:
-        extract_archive(archive, workdir)
+        if EXTRACT_CACHE:
+            digest, workdir = get_extraction_cache().acquire(archive)
+        else:
+            Path(workdir).mkdir(parents=True, exist_ok=True)
+            extract_archive(archive, workdir)
     except Exception as e:
         result = {
             "exit_code": -6,
@@ -129,8 +986,17 @@ def run_job(archive: str, cmd: str, timeout: int, memory: str, cpus: str):
             "stderr": f"Extraction failed: {e}",
             "duration_seconds": 0
         }
-        return job_id, write_trace(job_id, archive, cmd, result, workdir)
+        return job_id, write_trace(job_id, archive, cmd, result, workdir, events, prompt)
+
+    try:
+        return job_id, _run_extracted(job_id, archive, workdir, cmd, timeout, memory, cpus, warm_pool, events, prompt)
+    finally:
+        if digest:
+            get_extraction_cache().release(digest)
 
+def _run_extracted(job_id: str, archive: str, workdir: str, cmd: str, timeout: int, memory: str, cpus: str, warm_pool: bool,
+                   events: TraceEventLog = None, prompt: str = None) -> str:
+    stdin_data = prompt.encode("utf-8") if prompt is not None else None
     # Validate command target (first python argument)
     # If cmd looks like: python agent_main.py ...
     parts = cmd.strip().split()
@@ -147,39 +1013,36 @@ def run_job(archive: str, cmd: str, timeout: int, memory: str, cpus: str):
                 "stderr": f"Command target missing: {target_file} in archive root. Files: {sorted(os.listdir(workdir))[:20]}",
                 "duration_seconds": 0
             }
-            return job_id, write_trace(job_id, archive, cmd, result, workdir)
+            return write_trace(job_id, archive, cmd, result, workdir, events, prompt)
 
     # If Docker unavailable, fallback direct execution (no isolation)
     if not docker_available():
         start = time.time()
-        try:
-            proc = subprocess.run(
-                ["bash", "-lc", f"cd {workdir} && {cmd}"],
-                capture_output=True, text=True, timeout=timeout
-            )
-            result = {
-                "exit_code": proc.returncode,
-                "stdout": proc.stdout,
-                "stderr": proc.stderr,
-                "duration_seconds": round(time.time() - start, 3)
-            }
-        except subprocess.TimeoutExpired:
-            result = {
-                "exit_code": -1,
-                "stdout": "",
-                "stderr": f"Timeout (no-docker fallback) after {timeout}s",
-                "duration_seconds": timeout
-            }
-        return job_id, write_trace(job_id, archive, cmd, result, workdir)
+        # workdir may be the shared extraction cache; keep the agent from writing bytecode into it
+        run = run_streaming(["bash", "-lc", f"cd {workdir} && {cmd}"], timeout, job_id,
+                            env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"}, events=events, stdin_data=stdin_data)
+        if run["timed_out"]:
+            run["returncode"] = -1
+            run["stderr"] += f"\nTimeout (no-docker fallback) after {timeout}s"
+        result = _streamed_result(run, start)
+        return write_trace(job_id, archive, cmd, result, workdir, events, prompt)
 
     # Docker path
     try:
-        result = run_in_docker(workdir, cmd, job_id, timeout_s=timeout, memory=memory, cpus=cpus)
+        if warm_pool:
+            profile = ContainerPool.profile(archive, memory, cpus)
+            result = run_in_warm_container(workdir, cmd, profile, timeout_s=timeout, job_id=job_id, events=events, stdin_data=stdin_data)
+        else:
+            result = run_in_docker(workdir, cmd, job_id, timeout_s=timeout, memory=memory, cpus=cpus, events=events, stdin_data=stdin_data)
     except Exception as e:
         result = {"exit_code": -2, "stdout": "", "stderr": f"Docker run exception: {e}", "duration_seconds": 0}
 
-    trace_path = write_trace(job_id, archive, cmd, result, workdir)
-    return job_id, trace_path
+    return write_trace(job_id, archive, cmd, result, workdir, events, prompt)
+
+async def run_job_async(archive: str, cmd: str = "python agent_main.py", timeout: int = 30, memory: str = "256m", cpus: str = "0.5", warm_pool: bool = None,
+                        job_id: str = None, prompt: str = None):
+    """Async variant of run_job; the blocking sandbox work runs in a worker thread."""
+    return await asyncio.to_thread(run_job, archive, cmd, timeout, memory, cpus, warm_pool, job_id, prompt)
 
 if __name__ == "__main__":
     p = argparse.ArgumentParser()
@@ -188,6 +1051,17 @@ if __name__ == "__main__":
     p.add_argument("--timeout", type=int, default=30)
     p.add_argument("--memory", default="256m")
     p.add_argument("--cpus", default="0.5")
+    p.add_argument("--warm-pool", action="store_true", default=WARM_POOL, help="lease a pre-started container instead of docker run")
+    p.add_argument("--prompt", default=None, help="prompt to send on the agent's stdin")
     a = p.parse_args()
-    jid, path = run_job(a.archive, a.cmd, a.timeout, a.memory, a.cpus)
+    if os.getenv("NLE_TRACE_INDEX", "1") == "1":
+        # API jobs are indexed by api/tasks/sandbox_job.py; index CLI runs the same way
+        import sys
+        sys.path.append(str(Path(__file__).resolve().parent.parent))
+        try:
+            from api.tasks.run_index import record_trace
+            add_trace_hook(record_trace)
+        except ImportError as e:
+            print(f"WARNING: trace will not be indexed: {e}")
+    jid, path = run_job(a.archive, a.cmd, a.timeout, a.memory, a.cpus, warm_pool=a.warm_pool, prompt=a.prompt)
     print(json.dumps({"job_id": jid, "trace_path": path}))
\ No newline at end of file
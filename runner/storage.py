@@ -0,0 +1,172 @@
+import io
+import os
+import gzip
+import json
+import hashlib
+import threading
+
+try:
+    import zstandard
+except ImportError:  # optional; compact mode falls back to gzip
+    zstandard = None
+
+# "pretty" (indent=2 JSON, the historical format) or "compact" (minified +
+# compressed files, raw results reference traces instead of embedding them)
+STORAGE_MODE = os.getenv("NLE_STORAGE", "pretty")
+COMPRESSION = os.getenv("NLE_COMPRESSION", "zstd" if zstandard else "gzip")
+ZSTD_LEVEL = int(os.getenv("NLE_ZSTD_LEVEL", "6"))
+GZIP_LEVEL = 6
+
+_SUFFIX = {"zstd": ".zst", "gzip": ".gz"}
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+_GZIP_MAGIC = b"\x1f\x8b"
+
+def compact() -> bool:
+    return STORAGE_MODE == "compact"
+
+def storage_path(path: str, compressed: bool = None) -> str:
+    """Path a document logically named `path` is written to in the current mode."""
+    compressed = compact() if compressed is None else compressed
+    if not compressed:
+        return str(path)
+    if COMPRESSION == "zstd" and zstandard is None:
+        raise RuntimeError("NLE_COMPRESSION=zstd needs the zstandard package")
+    return str(path) + _SUFFIX[COMPRESSION]
+
+def resolve(path: str):
+    """First existing file among `path` and its compressed variants, or None."""
+    for candidate in (str(path), str(path) + ".zst", str(path) + ".gz"):
+        if os.path.exists(candidate):
+            return candidate
+    return None
+
+def base_name(path: str) -> str:
+    """`path` without a compression suffix (x_trace.json.zst -> x_trace.json)."""
+    path = str(path)
+    for suffix in _SUFFIX.values():
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+def _decode(data: bytes) -> bytes:
+    if data.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("file is zstd-compressed but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    if data.startswith(_GZIP_MAGIC):
+        return gzip.decompress(data)
+    return data
+
+def read_bytes(path: str) -> bytes:
+    """Decoded contents of `path` (or of its compressed variant); encoding is sniffed from magic bytes."""
+    real = resolve(path)
+    if real is None:
+        raise FileNotFoundError(path)
+    with open(real, "rb") as f:
+        return _decode(f.read())
+
+def load_json(path: str):
+    return json.loads(read_bytes(path))
+
+def open_text(path: str):
+    """Text stream over a possibly compressed file, for line-by-line readers."""
+    real = resolve(path)
+    if real is None:
+        raise FileNotFoundError(path)
+    raw = open(real, "rb")
+    head = raw.read(4)
+    raw.seek(0)
+    if head.startswith(_ZSTD_MAGIC):
+        if zstandard is None:
+            raise RuntimeError("file is zstd-compressed but the zstandard package is not installed")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=True), encoding="utf-8")
+    if head.startswith(_GZIP_MAGIC):
+        return io.TextIOWrapper(gzip.GzipFile(fileobj=raw), encoding="utf-8")
+    return io.TextIOWrapper(raw, encoding="utf-8")
+
+class _Writer(io.TextIOWrapper):
+    """Text writer that compresses on the fly and renames into place on close."""
+
+    def __init__(self, final: str, compressed: bool):
+        self.final = final
+        self.tmp = f"{final}.{os.getpid()}.{threading.get_ident()}.tmp"
+        self._raw = open(self.tmp, "wb")
+        if compressed and COMPRESSION == "zstd":
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(self._raw, closefd=False)
+        elif compressed:
+            stream = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=GZIP_LEVEL, mtime=0)
+        else:
+            stream = self._raw
+        super().__init__(stream, encoding="utf-8")
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        if not self._raw.closed:
+            self._raw.close()
+        os.replace(self.tmp, self.final)
+        # Drop a copy in the other format so readers never pick up stale data
+        base = base_name(self.final)
+        for other in (base, base + ".zst", base + ".gz"):
+            if other != self.final and os.path.exists(other):
+                os.remove(other)
+
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.close()
+            return
+        # Never rename a half-written file into place
+        super().close()
+        self._raw.close()
+        os.remove(self.tmp)
+
+def open_write(path: str, compressed: bool = None):
+    """
+    Opens the document logically named `path` for writing in the current
+    mode; the returned stream's `.final` is the real file name.
+    """
+    return _Writer(storage_path(path, compressed), compact() if compressed is None else compressed)
+
+def dump_json(obj, path: str, compressed: bool = None) -> str:
+    """Writes `obj` (minified + compressed in compact mode, indent=2 otherwise); returns the file written."""
+    is_compact = compact() if compressed is None else compressed
+    with open_write(path, is_compact) as f:
+        if is_compact:
+            json.dump(obj, f, separators=(",", ":"))
+        else:
+            json.dump(obj, f, indent=2)
+    return f.final
+
+def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def ref_trace(test: dict) -> dict:
+    """
+    In compact mode, replaces a raw-results test's embedded trace with a
+    reference (trace path + content hash); otherwise returns it unchanged.
+    """
+    if not compact() or not test.get("trace_path") or "trace" not in test:
+        return test
+    out = {k: v for k, v in test.items() if k != "trace"}
+    out["trace_ref"] = {"path": test["trace_path"], "sha256": file_sha256(test["trace_path"])}
+    return out
+
+def hydrate_trace(test: dict) -> dict:
+    """Inverse of ref_trace: loads the referenced trace back into test["trace"]."""
+    ref = test.get("trace_ref")
+    if "trace" in test or not ref:
+        return test
+    try:
+        with open(ref["path"], "rb") as f:
+            data = f.read()
+    except OSError:
+        return {**test, "trace": {}, "trace_error": f"trace not found: {ref['path']}"}
+    out = {**test, "trace": json.loads(_decode(data))}
+    if ref.get("sha256") and hashlib.sha256(data).hexdigest() != ref["sha256"]:
+        out["trace_error"] = "trace file changed since the raw results were written"
+    return out
@@ -59,41 +59,55 @@ def call_gemini(prompt_text: str) -> str:
         return f"Gemini Error: {str(e)}"
 
 # ---- Main Logic ----
-def main():
-    # Read input
-    prompt = "Hello"
-    if not sys.stdin.isatty():
-        prompt = sys.stdin.read().strip() or prompt
-    elif len(sys.argv) >= 2:
-        prompt = " ".join(sys.argv[1:])
-
+def respond(prompt: str):
+    """Returns (tool_calls, text) for one prompt."""
     tool_calls = []
-    
+
     # Tool Detection
     if "turn" in prompt.lower() and ("on" in prompt.lower() or "off" in prompt.lower()):
         # Simplified regex for demo
         tool_calls.append(device_api("living_room_light", "on" if "on" in prompt.lower() else "off"))
-        print(json.dumps({"tool_calls": tool_calls}))
-        print(f"OK: Processed {prompt}")
-        return
+        return tool_calls, f"OK: Processed {prompt}"
 
     if "calculate" in prompt.lower() or "*" in prompt or "+" in prompt:
         # Extract simple math
         m = re.search(r"([0-9\.\+\-\*\/\(\) ]+)", prompt)
         if m:
             tool_calls.append(calculator(m.group(1).strip()))
-            print(json.dumps({"tool_calls": tool_calls}))
-            print(f"Result: {tool_calls[0]['result'].get('value')}")
-            return
+            return tool_calls, f"Result: {tool_calls[0]['result'].get('value')}"
 
     if "convert" in prompt.lower():
         tool_calls.append(currency_convert(150, "USD", "INR")) # Hardcoded for demo reliability
-        print(json.dumps({"tool_calls": tool_calls}))
-        print("Converted 150 USD to INR")
-        return
+        return tool_calls, "Converted 150 USD to INR"
 
     # Fallback to Gemini
-    print(call_gemini(prompt))
+    return tool_calls, call_gemini(prompt)
+
+def serve():
+    # Persistent mode: one JSON request per stdin line, one JSON response per stdout line
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        req = json.loads(line)
+        tool_calls, text = respond(req.get("prompt") or "Hello")
+        print(json.dumps({"id": req.get("id"), "output": text, "tool_calls": tool_calls}), flush=True)
+
+def main():
+    if os.environ.get("NLE_AGENT_PROTOCOL") == "jsonl" or "--serve" in sys.argv[1:]:
+        serve()
+        return
+
+    # Read input
+    prompt = "Hello"
+    if not sys.stdin.isatty():
+        prompt = sys.stdin.read().strip() or prompt
+    elif len(sys.argv) >= 2:
+        prompt = " ".join(sys.argv[1:])
+
+    tool_calls, text = respond(prompt)
+    if tool_calls:
+        print(json.dumps({"tool_calls": tool_calls}))
+    print(text)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
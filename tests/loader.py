@@ -1,14 +1,106 @@
+import os
+import json
 import yaml
+import hashlib
 from pathlib import Path
-from .schema import TestSuite
+from .schema import TestSuite, TestCase
+
+# Validated suites are compiled to JSONL here (header line + one test per
+# line) so a re-run skips YAML parsing and validation. Empty disables it.
+SUITE_CACHE_DIR = os.environ.get("NLE_SUITE_CACHE_DIR", "data/suite_cache")
+CACHE_FORMAT = "nle-suite-cache/1"
+# libyaml's loader is several times faster than the pure-Python one
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+def _cache_path(p: Path) -> Path:
+    return Path(SUITE_CACHE_DIR) / (hashlib.sha256(str(p.resolve()).encode("utf-8")).hexdigest()[:32] + ".jsonl")
+
+def _read_header(cache: Path):
+    try:
+        with open(cache, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return header if isinstance(header, dict) and header.get("format") == CACHE_FORMAT else None
+
+def _write_cache(cache: Path, header: dict, lines):
+    tmp = cache.with_name(f"{cache.name}.{os.getpid()}.tmp")
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header) + "\n")
+            f.writelines(lines)
+        os.replace(tmp, cache)
+    except OSError as e:
+        # The cache is an optimisation only; a read-only data dir just means no caching
+        print(f"WARNING: could not write suite cache {cache}: {e}")
+        if tmp.exists():
+            tmp.unlink()
+
+def _cached(p: Path):
+    """(cache path, header) when the compiled cache still matches the YAML file, else None."""
+    if not SUITE_CACHE_DIR:
+        return None
+    cache = _cache_path(p)
+    header = _read_header(cache)
+    if header is None:
+        return None
+    st = p.stat()
+    if header["mtime_ns"] == st.st_mtime_ns and header["size"] == st.st_size:
+        return cache, header
+    # Touched (checkout, copy) but maybe not changed: fall back to the content hash
+    if header["sha256"] != hashlib.sha256(p.read_bytes()).hexdigest():
+        return None
+    header = {**header, "mtime_ns": st.st_mtime_ns, "size": st.st_size}
+    with open(cache, "r", encoding="utf-8") as f:
+        next(f)
+        _write_cache(cache, header, list(f))
+    return cache, header
+
+def _compile(p: Path) -> TestSuite:
+    data = p.read_bytes()
+    st = p.stat()
+    suite = TestSuite.model_validate(yaml.load(data, Loader=YAML_LOADER))
+    if SUITE_CACHE_DIR:
+        header = {"format": CACHE_FORMAT, "source": str(p), "mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                  "sha256": hashlib.sha256(data).hexdigest(), "suite": suite.suite,
+                  "description": suite.description, "count": len(suite.tests)}
+        _write_cache(_cache_path(p), header, (json.dumps(tc.model_dump()) + "\n" for tc in suite.tests))
+    return suite
+
+def _cached_tests(cache: Path):
+    # Cached rows were validated when compiled, so skip validation on the way back in
+    with open(cache, "r", encoding="utf-8") as f:
+        next(f)
+        for line in f:
+            yield TestCase.model_construct(**json.loads(line))
 
 def load_suite(path):
     p = Path(path)
-    raw = yaml.safe_load(p.read_text())
-    suite = TestSuite(**raw)
-    return suite
+    hit = _cached(p)
+    if hit is None:
+        return _compile(p)
+    cache, header = hit
+    return TestSuite.model_construct(suite=header["suite"], description=header["description"], tests=list(_cached_tests(cache)))
+
+def iter_tests(path):
+    """
+    Yields a suite's test cases one at a time from the compiled cache
+    (compiling it first if needed), without holding the whole suite.
+    """
+    p = Path(path)
+    hit = _cached(p)
+    if hit is None:
+        suite = _compile(p)
+        hit = _cached(p)
+        if hit is None:
+            # Caching disabled or not writable
+            yield from suite.tests
+            return
+        del suite
+    yield from _cached_tests(hit[0])
 
 def load_all_tests(tests_dir="tests/examples"):
     from glob import glob
-    for f in glob(f"{tests_dir}/*.yaml"):
-        yield load_suite(f)
\ No newline at end of file
+    for f in sorted(glob(f"{tests_dir}/*.yaml")):
+        yield load_suite(f)